@@ -38,6 +38,8 @@ aggregated_trades AS (
     SUM(CASE WHEN transaction_label = 'Sell' THEN token_sold_amount ELSE 0 END) AS outcome,
     SUM(CASE WHEN transaction_label = 'Buy' THEN token_sold_amount ELSE 0 END) AS spent_amount,
     SUM(CASE WHEN transaction_label = 'Sell' THEN token_bought_amount ELSE 0 END) AS earned_amount,
+    SUM(CASE WHEN transaction_label = 'Buy' THEN amount_usd ELSE 0 END) AS spent_usd,
+    SUM(CASE WHEN transaction_label = 'Sell' THEN amount_usd ELSE 0 END) AS earned_usd,
     COUNT(CASE WHEN transaction_label = 'Buy' THEN 1 ELSE NULL END) AS number_buys,
     COUNT(CASE WHEN transaction_label = 'Sell' THEN 1 ELSE NULL END) AS number_sells,
     MIN(tx_from) AS tx_from,
@@ -84,7 +86,9 @@ SELECT
       CAST(date_diff('second', first_block_time, last_block_time) % 60 AS VARCHAR) || 's'
     ELSE
       CAST(date_diff('second', first_block_time, last_block_time) AS VARCHAR) || 's'
-  END AS time_traded
+  END AS time_traded,
+  spent_usd,
+  earned_usd
 FROM aggregated_trades
 WHERE token_symbol != 'ETH'
 ORDER BY first_block_time DESC;
@@ -0,0 +1,53 @@
+-- Per-token, per-day trade aggregates for one wallet, restricted to trades from {{since}} on.
+-- Used for incremental refreshes: the bot keeps these buckets locally and only asks
+-- Dune again for the days since a little before its newest trade ({{since}} is a
+-- midnight), replacing those days so trades indexed late are included. Same filters
+-- and sums as transaction.sql.
+WITH wallet AS (
+  SELECT '{{wallet}}' AS user_wallet
+),
+filtered_trades AS (
+  SELECT
+    trader_id AS maker,
+    CASE
+      WHEN token_bought_symbol = 'SOL' THEN token_sold_mint_address
+      WHEN token_sold_symbol = 'SOL' THEN token_bought_mint_address
+    END AS project_token_address,
+    token_sold_symbol,
+    token_sold_amount,
+    token_bought_symbol,
+    token_bought_amount,
+    amount_usd,
+    block_time,
+    CASE
+      WHEN token_bought_symbol = 'SOL' THEN 'Sell'
+      WHEN token_sold_symbol = 'SOL' THEN 'Buy'
+    END AS transaction_label
+  FROM dex_solana.trades
+  WHERE
+    blockchain = 'solana'
+    AND (token_bought_symbol = 'SOL' OR token_sold_symbol = 'SOL')
+    AND NOT token_sold_symbol IN ('wstETH','UST','DAI','WBTC','ADA','BTCB','BUSD', 'USDT', 'USDC', 'Cake', 'MATIC', 'BSC-USD','ETH')
+    AND NOT token_bought_symbol IN ('wstETH','UST','DAI','WBTC','ADA','BTCB','ETH','BUSD', 'USDT', 'USDC', 'Cake', 'MATIC', 'BSC-USD', 'ETH')
+    AND (trader_id = (SELECT user_wallet FROM wallet))
+    AND block_time >= DATE_ADD('day', {{day}}, CURRENT_DATE)
+    AND block_time >= CAST('{{since}}' AS TIMESTAMP)
+)
+SELECT
+  COALESCE(NULLIF(token_sold_symbol, 'SOL'), token_bought_symbol) AS token_symbol,
+  project_token_address AS token_address,
+  maker,
+  CAST(block_time AS DATE) AS block_date,
+  SUM(CASE WHEN transaction_label = 'Buy' THEN token_bought_amount ELSE 0 END) AS incoming,
+  SUM(CASE WHEN transaction_label = 'Sell' THEN token_sold_amount ELSE 0 END) AS outcome,
+  SUM(CASE WHEN transaction_label = 'Buy' THEN token_sold_amount ELSE 0 END) AS spent_amount,
+  SUM(CASE WHEN transaction_label = 'Sell' THEN token_bought_amount ELSE 0 END) AS earned_amount,
+  SUM(CASE WHEN transaction_label = 'Buy' THEN amount_usd ELSE 0 END) AS spent_usd,
+  SUM(CASE WHEN transaction_label = 'Sell' THEN amount_usd ELSE 0 END) AS earned_usd,
+  COUNT(CASE WHEN transaction_label = 'Buy' THEN 1 ELSE NULL END) AS number_buys,
+  COUNT(CASE WHEN transaction_label = 'Sell' THEN 1 ELSE NULL END) AS number_sells,
+  MIN(block_time) AS first_block_time,
+  MAX(block_time) AS last_block_time
+FROM filtered_trades
+GROUP BY 1, 2, 3, 4
+ORDER BY last_block_time DESC;
@@ -46,6 +46,8 @@ aggregated_trades AS (
     SUM(CASE WHEN transaction_label = 'Sell' THEN token_sold_amount ELSE 0 END) AS outcome,
     SUM(CASE WHEN transaction_label = 'Buy' THEN token_sold_amount ELSE 0 END) AS spent_amount,
     SUM(CASE WHEN transaction_label = 'Sell' THEN token_bought_amount ELSE 0 END) AS earned_amount,
+    SUM(CASE WHEN transaction_label = 'Buy' THEN amount_usd ELSE 0 END) AS spent_usd,
+    SUM(CASE WHEN transaction_label = 'Sell' THEN amount_usd ELSE 0 END) AS earned_usd,
     COUNT(CASE WHEN transaction_label = 'Buy' THEN 1 ELSE NULL END) AS number_buys,
     COUNT(CASE WHEN transaction_label = 'Sell' THEN 1 ELSE NULL END) AS number_sells,
     MIN(tx_id) AS tx_id,
@@ -94,7 +96,9 @@ SELECT
 
 
 
-date_format(first_block_time, '%d.%m.%Y') AS block_time
+date_format(first_block_time, '%d.%m.%Y') AS block_time,
+  spent_usd,
+  earned_usd
 FROM aggregated_trades
 WHERE token_symbol != 'SOL'
 ORDER BY first_block_time DESC;
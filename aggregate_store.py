@@ -0,0 +1,141 @@
+import os
+import sqlite3
+import threading
+
+import pandas as pd
+
+from pnl_aggregates import AGGREGATE_COLUMNS
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS daily_aggregates (
+    chain TEXT NOT NULL,
+    wallet TEXT NOT NULL,
+    token_symbol TEXT,
+    token_address TEXT,
+    maker TEXT,
+    block_date TEXT NOT NULL,
+    incoming REAL NOT NULL,
+    outcome REAL NOT NULL,
+    spent_amount REAL NOT NULL,
+    earned_amount REAL NOT NULL,
+    spent_usd REAL NOT NULL,
+    earned_usd REAL NOT NULL,
+    number_buys INTEGER NOT NULL,
+    number_sells INTEGER NOT NULL,
+    first_block_time TEXT NOT NULL,
+    last_block_time TEXT NOT NULL,
+    PRIMARY KEY (chain, wallet, token_symbol, token_address, maker, block_date)
+);
+CREATE TABLE IF NOT EXISTS wallet_sync (
+    chain TEXT NOT NULL,
+    wallet TEXT NOT NULL,
+    last_block_time TEXT NOT NULL,
+    PRIMARY KEY (chain, wallet)
+);
+"""
+
+INSERT = "INSERT INTO daily_aggregates (chain, wallet, {columns}) VALUES (?, ?, {placeholders})".format(
+    columns=', '.join(AGGREGATE_COLUMNS), placeholders=', '.join('?' * len(AGGREGATE_COLUMNS))
+)
+
+
+class AggregateStore:
+    """SQLite store of per-wallet, per-token daily trade aggregates for incremental refreshes.
+
+    wallet_sync remembers the newest block_time seen per wallet. The next
+    delta query re-reads whole days from a little before it (see
+    pnl_aggregates.requery_start), so trades Dune indexes late are picked up,
+    and merging the delta replaces the stored buckets of those days.
+    """
+
+    def __init__(self, path=None):
+        self.path = path or os.getenv('PNL_STORE_PATH', 'pnl_aggregates.sqlite3')
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(self.path, check_same_thread=False)
+        with self._lock, self._connection:
+            self._drop_outdated_schema()
+            self._connection.executescript(SCHEMA)
+
+    def _drop_outdated_schema(self):
+        # The store is a cache of Dune results: when the bucket columns change, start over
+        # and let the next refresh fetch full history again rather than mixing old rows in
+        columns = {row[1] for row in self._connection.execute("PRAGMA table_info(daily_aggregates)")}
+        if columns and not set(AGGREGATE_COLUMNS) <= columns:
+            self._connection.execute("DROP TABLE daily_aggregates")
+            self._connection.execute("DROP TABLE IF EXISTS wallet_sync")
+
+    def last_block_time(self, chain, wallet):
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT last_block_time FROM wallet_sync WHERE chain = ? AND wallet = ?", (chain, wallet)
+            ).fetchone()
+        return row[0] if row else None
+
+    def merge(self, chain, wallet, aggregates_df, since=None, start=None):
+        """Store normalized daily aggregates (see pnl_aggregates.normalize_aggregates) for a wallet.
+
+        since is the last_block_time stored when the delta was queried (None for
+        a wallet never synced) and start the midnight the delta was queried
+        from: every stored bucket from that day on is replaced by the delta's.
+        When another refresh of the wallet (a retry, another worker) has moved
+        the sync point in the meantime, this delta may be older than what it
+        stored and nothing is merged. Returns whether the delta was merged.
+        """
+        if since is None and aggregates_df.empty:
+            return True
+        rows = [(chain, wallet, *row) for row in aggregates_df[AGGREGATE_COLUMNS].itertuples(index=False, name=None)]
+        newest = since if aggregates_df.empty else aggregates_df['last_block_time'].max()
+        with self._lock, self._connection:
+            # Moving the sync point is the first write, so it takes the database lock before the check
+            # and a concurrent merge from another process sees the new value
+            if since is None:
+                moved = self._connection.execute(
+                    "INSERT INTO wallet_sync (chain, wallet, last_block_time) VALUES (?, ?, ?) "
+                    "ON CONFLICT (chain, wallet) DO NOTHING",
+                    (chain, wallet, newest),
+                ).rowcount
+            else:
+                moved = self._connection.execute(
+                    "UPDATE wallet_sync SET last_block_time = MAX(last_block_time, ?) "
+                    "WHERE chain = ? AND wallet = ? AND last_block_time = ?",
+                    (newest, chain, wallet, since),
+                ).rowcount
+            if not moved:
+                return False
+            if start is not None:
+                self._connection.execute(
+                    "DELETE FROM daily_aggregates WHERE chain = ? AND wallet = ? AND block_date >= ?",
+                    (chain, wallet, start[:10]),
+                )
+            self._connection.executemany(INSERT, rows)
+        return True
+
+    def prune(self, chain, wallet, before_date):
+        """Drop buckets that have fallen out of the reporting window."""
+        with self._lock, self._connection:
+            self._connection.execute(
+                "DELETE FROM daily_aggregates WHERE chain = ? AND wallet = ? AND block_date < ?",
+                (chain, wallet, before_date),
+            )
+
+    def load(self, chain, wallet, since_date):
+        with self._lock:
+            return pd.read_sql_query(
+                f"SELECT {', '.join(AGGREGATE_COLUMNS)} FROM daily_aggregates "
+                "WHERE chain = ? AND wallet = ? AND block_date >= ?",
+                self._connection,
+                params=(chain, wallet, since_date),
+            )
+
+
+_aggregate_store = None
+_aggregate_store_lock = threading.Lock()
+
+
+def get_aggregate_store():
+    """Return the process-wide AggregateStore at PNL_STORE_PATH."""
+    global _aggregate_store
+    with _aggregate_store_lock:
+        if _aggregate_store is None:
+            _aggregate_store = AggregateStore()
+        return _aggregate_store
@@ -0,0 +1,185 @@
+import argparse
+import asyncio
+import io
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+from dune_client.query import QueryBase
+from dune_client.types import QueryParameter
+from openpyxl.worksheet.hyperlink import Hyperlink
+
+from dune_cache import get_query_cache
+from dune_clients import get_async_dune_client, get_dune_client
+from dune_scheduler import get_dune_scheduler
+from pnl_aggregates import build_transaction_df, normalize_aggregates, window_start
+from pnl_report import HYPERLINK_FONT, CHAIN_SPECS, PnlReportEngine, format_table_sheet, trade_count
+from pnl_summary import summarize_transactions
+
+LEADERBOARD_SHEET = 'Leaderboard'
+
+
+class BatchReport:
+    """PnL for many wallets of one chain from a few chunked Dune executions, ranked in one workbook.
+
+    Wallets are sent BATCH_CHUNK_SIZE (default 50) at a time to the chain's
+    daily_aggregates_batch.sql, at most BATCH_MAX_PARALLEL (default 3) chunks
+    at once. Each wallet's buckets are then rolled up locally exactly like a
+    single-wallet incremental report. Each chunk runs on the Dune tier its
+    wallets' combined activity from earlier reports calls for.
+    """
+
+    def __init__(self, chain, wallets, day='-30', chunk_size=None, user=None):
+        self.chain = chain
+        self.spec = CHAIN_SPECS[chain]
+        # Keep the caller's order but drop repeats (EVM addresses compare case-insensitively)
+        unique = {}
+        for wallet in (wallet.strip() for wallet in wallets):
+            if wallet:
+                unique.setdefault(self._wallet_key(wallet), wallet)
+        self.wallets = list(unique.values())
+        invalid = [wallet for wallet in self.wallets if not self.spec['address_validator'](wallet)]
+        if invalid:
+            raise ValueError(f"Invalid {self.spec['name']} wallet address(es): {', '.join(invalid)}")
+        if not self.wallets:
+            raise ValueError('No wallet addresses given.')
+        self.BATCH_QUERY_ID = int(os.getenv(f'{chain.upper()}_BATCH_QUERY_ID', '0')) or self.spec['batch_query_id']
+        if not self.BATCH_QUERY_ID:
+            raise ValueError(f'No batch query configured for {chain}; set {chain.upper()}_BATCH_QUERY_ID.')
+        self.day = day
+        self.chunk_size = chunk_size or int(os.getenv('BATCH_CHUNK_SIZE', '50'))
+        self.max_parallel = int(os.getenv('BATCH_MAX_PARALLEL', '3'))
+        self.dune = get_dune_client()
+        self.query_cache = get_query_cache()
+        self.scheduler = get_dune_scheduler()
+        self.user = user
+        self.reports_folder = "reports"
+        self.output_file_path = os.path.join(self.reports_folder, f"{chain}_batch_{len(self.wallets)}_wallets.xlsx")
+
+        self.reports = []
+        self.leaderboard_df = None
+
+    def _wallet_key(self, wallet):
+        return wallet if self.spec['address_case_sensitive'] else wallet.lower()
+
+    def _chunk_queries(self):
+        """(wallets, query) for each chunk of at most chunk_size wallets."""
+        queries = []
+        for start in range(0, len(self.wallets), self.chunk_size):
+            chunk = self.wallets[start:start + self.chunk_size]
+            params = [
+                QueryParameter.text_type(name='day', value=self.day),
+                QueryParameter.text_type(name='wallets', value=','.join(chunk)),
+            ]
+            queries.append((chunk, QueryBase(query_id=self.BATCH_QUERY_ID, params=params)))
+        return queries
+
+    def _scheduled_queries(self, dune):
+        """(client, query) per chunk, each client on the shared DuneScheduler at the chunk's tier."""
+        scheduled = []
+        for chunk, query in self._chunk_queries():
+            expected = self.scheduler.expected_trades(self.chain, [self._wallet_key(wallet) for wallet in chunk])
+            scheduled.append((self.scheduler.client(dune, user=self.user, chain=self.chain, expected_trades=expected), query))
+        return scheduled
+
+    def fetch_data(self):
+        scheduled = self._scheduled_queries(self.dune)
+        with ThreadPoolExecutor(max_workers=min(self.max_parallel, len(scheduled))) as executor:
+            frames = list(executor.map(lambda pair: self.query_cache.run_query_dataframe(*pair), scheduled))
+        self._build_reports(frames)
+
+    async def fetch_data_async(self):
+        scheduled = await asyncio.to_thread(self._scheduled_queries, get_async_dune_client())
+        limit = asyncio.Semaphore(self.max_parallel)
+
+        async def run(dune, query):
+            async with limit:
+                return await self.query_cache.run_query_dataframe_async(dune, query)
+
+        frames = await asyncio.gather(*(run(dune, query) for dune, query in scheduled))
+        await asyncio.to_thread(self._build_reports, frames)
+
+    def _build_reports(self, frames):
+        """Split the chunk results per wallet and build one PnlReportEngine per wallet."""
+        daily_df = normalize_aggregates(pd.concat(frames, ignore_index=True))
+        daily_df = daily_df[daily_df['block_date'] >= window_start(self.day)]
+        makers = daily_df['maker'].astype(str).map(self._wallet_key)
+        by_maker = dict(tuple(daily_df.groupby(makers.to_numpy(), sort=False)))
+
+        self.reports = []
+        for wallet in self.wallets:
+            report = PnlReportEngine(self.chain, wallet, day=self.day, user=self.user)
+            report.transaction_df = build_transaction_df(by_maker.get(self._wallet_key(wallet), daily_df.iloc[:0]), self.spec)
+            report.summary_df = summarize_transactions(report.transaction_df, wallet, self.day, self.spec)
+            self.reports.append(report)
+
+        summaries = pd.concat([report.summary_df for report in self.reports], ignore_index=True)
+        order = summaries['actual_profit'].sort_values(ascending=False, na_position='last', kind='stable').index
+        self.reports = [self.reports[i] for i in order]
+        self.leaderboard_df = summaries.loc[order].reset_index(drop=True)
+        self.leaderboard_df.insert(0, 'rank', range(1, len(self.leaderboard_df) + 1))
+        self.scheduler.record_activity(
+            self.chain, {self._wallet_key(report.wallet_address): trade_count(report.transaction_df) for report in self.reports}
+        )
+
+    @staticmethod
+    def sheet_name(rank, wallet):
+        # Excel caps sheet names at 31 characters
+        return f"{rank}. {wallet[:6]}..{wallet[-4:]}"
+
+    def save_to_excel(self, target=None):
+        """Write the leaderboard followed by one styled sheet per wallet, in rank order."""
+        if target is None:
+            os.makedirs(self.reports_folder, exist_ok=True)
+            target = self.output_file_path
+        with pd.ExcelWriter(target, engine='openpyxl') as writer:
+            self.leaderboard_df.to_excel(writer, sheet_name=LEADERBOARD_SHEET, index=False)
+            for rank, report in enumerate(self.reports, start=1):
+                report.write_sheet(writer, sheet_name=self.sheet_name(rank, report.wallet_address))
+            self.apply_leaderboard_formatting(writer.sheets[LEADERBOARD_SHEET])
+        if isinstance(target, str):
+            print(f'Batch report for {len(self.reports)} wallets has been saved to {target}')
+
+    def apply_leaderboard_formatting(self, worksheet):
+        format_table_sheet(worksheet)
+        wallet_col = list(self.leaderboard_df.columns).index('id') + 1
+        for rank, report in enumerate(self.reports, start=1):
+            # Jump from the leaderboard row to the wallet's own sheet
+            cell = worksheet.cell(row=rank + 1, column=wallet_col)
+            cell.hyperlink = Hyperlink(ref=cell.coordinate, location=f"'{self.sheet_name(rank, report.wallet_address)}'!A1")
+            cell.font = HYPERLINK_FONT
+
+    def render_report_bytes(self):
+        buffer = io.BytesIO()
+        self.save_to_excel(buffer)
+        return buffer.getvalue()
+
+
+def read_wallets(values):
+    """Wallets from the command line; an argument naming a file contributes one wallet per line."""
+    wallets = []
+    for value in values:
+        if os.path.isfile(value):
+            with open(value) as file:
+                wallets.extend(line.strip() for line in file if line.strip() and not line.startswith('#'))
+        else:
+            wallets.extend(value.split(','))
+    return wallets
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Ranked PnL workbook for many wallets on one chain.')
+    parser.add_argument('chain', choices=sorted(CHAIN_SPECS))
+    parser.add_argument('wallets', nargs='+', help='addresses (comma separated allowed) or files with one address per line')
+    parser.add_argument('--day', default='-30', help='window start relative to today, as in the Dune queries')
+    parser.add_argument('--chunk-size', type=int, help='wallets per Dune execution (default BATCH_CHUNK_SIZE or 50)')
+    parser.add_argument('--output', help='xlsx path')
+    args = parser.parse_args()
+
+    batch = BatchReport(args.chain, read_wallets(args.wallets), day=args.day, chunk_size=args.chunk_size)
+    batch.fetch_data()
+    batch.save_to_excel(args.output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+"""Regression benchmark for save_to_excel/apply_formatting over synthetic reports.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_formatting [--sizes 100,1000,10000,50000] [--writers openpyxl,write_only]
+
+Every size is timed with each writer whatever REPORT_STREAMING_ROWS says:
+openpyxl (to_excel plus apply_formatting) and write_only (stream_sheet).
+Exits with status 1 when, for either writer, the per-row cost of the largest
+size grows by more than --max-scaling times the per-row cost of the smallest
+size, which is what a quadratic formatting pass looks like.
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DUNE_API_KEY', 'benchmark')
+os.environ.setdefault('DUNE_API_REQUEST_TIMEOUT', '10')
+
+import pnl_report
+from benchmarks.synthetic import summary_frame, transaction_frame
+from ETH_PNL import WalletReport
+
+DEFAULT_SIZES = (100, 1000, 10000, 50000)
+# STREAMING_ROWS that sends every report through each writer
+WRITERS = {'openpyxl': sys.maxsize, 'write_only': 0}
+
+
+def time_report(rows, folder, writer):
+    pnl_report.STREAMING_ROWS = WRITERS[writer]
+    report = WalletReport('0x' + '0' * 40)
+    report.output_file_path = os.path.join(folder, f'bench_{writer}_{rows}.xlsx')
+    report.summary_df = summary_frame(report.wallet_address)
+    report.transaction_df = transaction_frame(rows)
+    start = time.perf_counter()
+    report.save_to_excel()
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', default=','.join(str(size) for size in DEFAULT_SIZES))
+    parser.add_argument('--writers', default=','.join(WRITERS))
+    parser.add_argument('--max-scaling', type=float, default=3.0)
+    args = parser.parse_args()
+    sizes = [int(size) for size in args.sizes.split(',')]
+
+    failed = False
+    with tempfile.TemporaryDirectory() as folder:
+        for writer in args.writers.split(','):
+            per_row = {}
+            for rows in sizes:
+                elapsed = time_report(rows, folder, writer)
+                per_row[rows] = elapsed / rows
+                print(f'{writer:<10} {rows:>7} rows  {elapsed:8.3f}s  {per_row[rows] * 1e6:8.1f}us/row')
+
+            scaling = per_row[sizes[-1]] / per_row[sizes[0]]
+            print(f'{writer} per-row cost scaling {sizes[0]} -> {sizes[-1]}: {scaling:.2f}x')
+            if scaling > args.max_scaling:
+                print(f'FAIL: {writer} scaling exceeds {args.max_scaling}x')
+                failed = True
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,170 @@
+"""End-to-end report benchmark against the local Dune stand-in.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_report [--chains eth,bnb,sol] [--sizes 10,100,1000,10000,100000]
+        [--latency 0] [--fetch sync|async] [--streaming-rows N] [--json results.json]
+        [--baseline results.json --max-regression 1.5]
+
+Every (chain, size) runs generate_report in a fresh subprocess so peak RSS is
+per report. Stages: fetch (Dune stand-in plus local summary), write (pandas
+to_excel and workbook save) and format (apply_formatting). Reports at or
+above --streaming-rows (REPORT_STREAMING_ROWS) go through the write-only
+writer, which styles rows as it writes them, so their format time is 0 and
+write covers both. --fetch async fetches through fetch_data_async and the
+async stand-in, as the bot does. Either way executions go through the
+DuneScheduler, whose credit bookkeeping goes to a throwaway StateStore. With --baseline the run fails when any stage is slower
+than max-regression times the baseline.
+"""
+import argparse
+import asyncio
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DUNE_API_KEY', 'benchmark')
+os.environ.setdefault('DUNE_API_REQUEST_TIMEOUT', '10')
+if 'PNL_STATE_PATH' not in os.environ:
+    # Shared with the worker subprocesses through the environment
+    os.environ['PNL_STATE_PATH'] = os.path.join(tempfile.mkdtemp(prefix='bench_report_'), 'pnl_state.sqlite3')
+
+DEFAULT_CHAINS = ('eth', 'bnb', 'sol')
+DEFAULT_SIZES = (10, 100, 1000, 10000, 100000)
+STAGES = ('fetch', 'write', 'format', 'total')
+WALLETS = {'eth': '0x' + '1' * 40, 'bnb': '0x' + '2' * 40, 'sol': 'So1ana' * 6 + 'abcd'}
+
+
+def peak_rss_mb():
+    # ru_maxrss is in KiB on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def run_one(chain, tokens, latency, recordings_dir, fetch='sync'):
+    """Time one generate_report in this process and return its stage timings."""
+    from benchmarks.fake_dune import FakeAsyncDuneClient, FakeDuneClient
+    from dune_cache import QueryResultCache
+    import pnl_report
+    from pnl_report import PnlReportEngine
+
+    report = PnlReportEngine(chain, WALLETS[chain])
+    if fetch == 'async':
+        dune = FakeAsyncDuneClient(tokens=tokens, latency=latency, recordings_dir=recordings_dir)
+        pnl_report.get_async_dune_client = lambda: dune
+        fetch_data = lambda: asyncio.run(report.fetch_data_async())
+    else:
+        report.dune = FakeDuneClient(tokens=tokens, latency=latency, recordings_dir=recordings_dir)
+        fetch_data = report.fetch_data
+    report.query_cache = QueryResultCache(ttl_seconds=0)
+    folder = tempfile.mkdtemp()
+    report.reports_folder = folder
+    report.output_file_path = os.path.join(folder, f'{chain}_{tokens}.xlsx')
+    # Generate the synthetic result up front so fetch measures the report, not the generator
+    fetch_data()
+    rss_before = peak_rss_mb()
+
+    timings = {'format': 0.0}
+    format_worksheet = report.apply_formatting
+
+    def timed_formatting(worksheet):
+        start = time.perf_counter()
+        format_worksheet(worksheet)
+        timings['format'] = time.perf_counter() - start
+
+    report.apply_formatting = timed_formatting
+    start = time.perf_counter()
+    fetch_data()
+    fetched = time.perf_counter()
+    report.save_to_excel()
+    saved = time.perf_counter()
+
+    timings['fetch'] = fetched - start
+    timings['write'] = saved - fetched - timings['format']
+    timings['total'] = saved - start
+    return {
+        'chain': chain,
+        'tokens': tokens,
+        'fetch_mode': fetch,
+        'rows': len(report.transaction_df),
+        'writer': 'write_only' if len(report.transaction_df) >= pnl_report.STREAMING_ROWS else 'openpyxl',
+        **timings,
+        'peak_rss_mb': peak_rss_mb(),
+        'rss_growth_mb': peak_rss_mb() - rss_before,
+        'xlsx_kb': os.path.getsize(report.output_file_path) / 1024,
+    }
+
+
+def run_isolated(chain, tokens, latency, recordings_dir, streaming_rows=None, fetch='sync'):
+    command = [sys.executable, '-m', 'benchmarks.bench_report', '--worker', chain, str(tokens), '--latency', str(latency),
+               '--fetch', fetch]
+    if recordings_dir:
+        command += ['--recordings', recordings_dir]
+    env = dict(os.environ)
+    if streaming_rows is not None:
+        env['REPORT_STREAMING_ROWS'] = str(streaming_rows)
+    output = subprocess.run(command, check=True, capture_output=True, text=True, env=env).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def regressions(results, baseline, max_regression):
+    previous = {(row['chain'], row['tokens']): row for row in baseline}
+    failures = []
+    for row in results:
+        old = previous.get((row['chain'], row['tokens']))
+        if old is None:
+            continue
+        for stage in STAGES:
+            # Ignore stages under 50ms, their noise dominates
+            if old[stage] > 0.05 and row[stage] > old[stage] * max_regression:
+                failures.append(f"{row['chain']} {row['tokens']} {stage}: {old[stage]:.3f}s -> {row[stage]:.3f}s")
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--chains', default=','.join(DEFAULT_CHAINS))
+    parser.add_argument('--sizes', default=','.join(str(size) for size in DEFAULT_SIZES))
+    parser.add_argument('--latency', type=float, default=0.0, help='simulated Dune execution time per query, seconds')
+    parser.add_argument('--recordings', help='directory of recorded <query_id>.csv/.parquet results to serve instead')
+    parser.add_argument('--fetch', choices=('sync', 'async'), default='sync',
+                        help='fetch through fetch_data (threads) or fetch_data_async (event loop)')
+    parser.add_argument('--streaming-rows', type=int, help='row count from which the write-only writer is used (0 = always)')
+    parser.add_argument('--json', help='write the results here')
+    parser.add_argument('--baseline', help='results JSON from an earlier run to compare against')
+    parser.add_argument('--max-regression', type=float, default=1.5)
+    parser.add_argument('--worker', nargs=2, metavar=('CHAIN', 'TOKENS'), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        chain, tokens = args.worker
+        print(json.dumps(run_one(chain, int(tokens), args.latency, args.recordings, args.fetch)))
+        return 0
+
+    results = []
+    print(f"{'chain':<5} {'tokens':>7} {'fetch':>8} {'write':>8} {'format':>8} {'total':>8} {'peak MB':>8} {'xlsx KB':>8}")
+    for chain in args.chains.split(','):
+        for tokens in (int(size) for size in args.sizes.split(',')):
+            row = run_isolated(chain, tokens, args.latency, args.recordings, args.streaming_rows, args.fetch)
+            results.append(row)
+            print(f"{chain:<5} {tokens:>7} {row['fetch']:>8.3f} {row['write']:>8.3f} {row['format']:>8.3f} "
+                  f"{row['total']:>8.3f} {row['peak_rss_mb']:>8.1f} {row['xlsx_kb']:>8.0f}")
+
+    if args.json:
+        with open(args.json, 'w') as file:
+            json.dump(results, file, indent=2)
+    if args.baseline:
+        with open(args.baseline) as file:
+            failures = regressions(results, json.load(file), args.max_regression)
+        for failure in failures:
+            print(f'REGRESSION {failure}')
+        if failures:
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,65 @@
+"""Import-time benchmark for the bot entry points.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_startup [--modules main,main_simple] [--runs 5] [--max-seconds 1.0]
+
+Each run imports the module in a fresh interpreter, so nothing is cached
+between runs, and reports the median import time and which report
+dependencies (pandas, openpyxl, dune_client, ...) were imported with it.
+Exits with status 1 when a median exceeds --max-seconds or a report
+dependency is imported at startup.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_MODULES = ('main', 'main_simple')
+
+# Runs in the child interpreter; prints the import time and the heavy modules it loaded
+PROBE = """
+import json, sys, time
+start = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - start
+from report_stack import HEAVY_MODULES
+print(json.dumps({{'seconds': elapsed, 'heavy': [name for name in HEAVY_MODULES if name in sys.modules]}}))
+"""
+
+
+def time_import(module):
+    output = subprocess.run([sys.executable, '-c', PROBE.format(module=module)], cwd=ROOT,
+                            check=True, capture_output=True, text=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--modules', default=','.join(DEFAULT_MODULES))
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--max-seconds', type=float, default=1.0)
+    args = parser.parse_args()
+
+    failed = False
+    print(f"{'module':<12} {'median':>8} {'min':>8} {'max':>8}  heavy imports")
+    for module in args.modules.split(','):
+        runs = [time_import(module) for _ in range(args.runs)]
+        seconds = [run['seconds'] for run in runs]
+        heavy = sorted({name for run in runs for name in run['heavy']})
+        median = statistics.median(seconds)
+        print(f"{module:<12} {median:>8.3f} {min(seconds):>8.3f} {max(seconds):>8.3f}  {', '.join(heavy) or 'none'}")
+        if median > args.max_seconds:
+            print(f'FAIL: {module} imports in {median:.3f}s, over {args.max_seconds}s')
+            failed = True
+        if heavy:
+            print(f'FAIL: {module} imports {", ".join(heavy)} at startup')
+            failed = True
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,168 @@
+"""Local stand-ins for DuneClient and AsyncDuneClient, so reports can run without Dune credits.
+
+Results are synthetic (benchmarks.synthetic.daily_frame rolled up per chain)
+or, when recordings_dir holds `<query_id>.csv` / `<query_id>.parquet`, the
+recorded result set for that query. Results are handed out through a CSV
+round trip, like Dune's results/csv endpoint, so parsing cost is included.
+Every execution waits `latency` seconds, standing in for Dune queue and
+execution time.
+"""
+import asyncio
+import io
+import os
+import threading
+import time
+
+import pandas as pd
+from dune_client.models import ExecutionResponse, ExecutionResultCSV, ExecutionState, ExecutionStatusResponse
+
+from benchmarks.synthetic import daily_frame
+from pnl_aggregates import build_transaction_df
+from pnl_report import CHAIN_SPECS
+from pnl_summary import summarize_transactions
+
+
+class FakeDuneClient:
+    """Drop-in for DuneClient.run_query_dataframe serving every chain's transaction, summary and aggregate queries."""
+
+    def __init__(self, tokens=100, latency=0.0, recordings_dir=None, seed=0):
+        self.tokens = tokens
+        self.latency = latency
+        self.recordings_dir = recordings_dir
+        self.seed = seed
+        self.executions = 0
+        self.cancelled = []
+        self._results = {}
+        self._queries = {}
+        self._lock = threading.Lock()
+        self._query_chains = {}
+        for chain, spec in CHAIN_SPECS.items():
+            self._query_chains[spec['transaction_query_id']] = (chain, 'transaction')
+            self._query_chains[spec['summary_query_id']] = (chain, 'summary')
+
+    def result(self, query):
+        """The result set for query, parsed from memoized CSV as from a fresh download."""
+        params = query.request_format().get('query_parameters', {})
+        key = (query.query_id, tuple(sorted(params.items())))
+        with self._lock:
+            if key not in self._results:
+                self._results[key] = self._build(query.query_id, params).to_csv(index=False)
+            csv_text = self._results[key]
+        return pd.read_csv(io.StringIO(csv_text))
+
+    def _build(self, query_id, params):
+        recorded = self._recorded(query_id)
+        if recorded is not None:
+            return recorded
+        chain, kind = self._query_chains.get(query_id, (None, None))
+        if 'wallets' in params:
+            kind = 'batch'
+        elif 'since' in params:
+            kind = 'aggregate'
+        if chain is None:
+            chain = self._chain_for_wallet(params.get('wallet') or params['wallets'].split(',')[0])
+        spec = CHAIN_SPECS[chain]
+
+        if kind == 'batch':
+            wallets = params['wallets'].split(',')
+            return pd.concat(
+                [daily_frame(self.tokens, spec, wallet, seed=self.seed + i) for i, wallet in enumerate(wallets)],
+                ignore_index=True,
+            )
+        daily = daily_frame(self.tokens, spec, params['wallet'], seed=self.seed)
+        if kind == 'aggregate':
+            return daily
+        transactions = build_transaction_df(daily, spec)
+        if kind == 'summary':
+            return summarize_transactions(transactions, params['wallet'], params['day'], spec)
+        return transactions
+
+    @staticmethod
+    def _chain_for_wallet(wallet):
+        # Aggregate and batch query ids are deployment specific, so pick the chain from the address format
+        return 'eth' if wallet.startswith('0x') else 'sol'
+
+    def _recorded(self, query_id):
+        if not self.recordings_dir:
+            return None
+        for extension, reader in (('.parquet', pd.read_parquet), ('.csv', pd.read_csv)):
+            path = os.path.join(self.recordings_dir, f'{query_id}{extension}')
+            if os.path.exists(path):
+                return reader(path)
+        return None
+
+    def run_query_dataframe(self, query, performance='medium'):
+        self.executions += 1
+        time.sleep(self.latency)
+        return self.result(query)
+
+    def _submit(self, query):
+        with self._lock:
+            self.executions += 1
+            execution_id = f'fake-{self.executions}'
+            self._queries[execution_id] = (query, time.monotonic() + self.latency)
+        return execution_id
+
+    def _cancel(self, execution_id):
+        with self._lock:
+            if self._queries.pop(execution_id, None) is None:
+                return False
+            self.cancelled.append(execution_id)
+        return True
+
+    # execute_query / get_execution_status / cancel_execution / get_execution_results_csv follow DuneClient,
+    # finishing each execution `latency` seconds after it was submitted
+
+    def execute_query(self, query, performance='medium'):
+        return ExecutionResponse(execution_id=self._submit(query), state=ExecutionState.PENDING)
+
+    def get_execution_status(self, execution_id):
+        query, done_at = self._queries[execution_id]
+        state = ExecutionState.COMPLETED if time.monotonic() >= done_at else ExecutionState.EXECUTING
+        return ExecutionStatusResponse.from_dict({
+            'execution_id': execution_id, 'query_id': query.query_id, 'state': state.value,
+            'submitted_at': '2024-01-01T00:00:00Z',
+        })
+
+    def cancel_execution(self, execution_id):
+        return self._cancel(execution_id)
+
+    def get_execution_results_csv(self, execution_id, limit=None, offset=None):
+        query, _ = self._queries.pop(execution_id)
+        return ExecutionResultCSV(data=io.BytesIO(self.result(query).to_csv(index=False).encode()))
+
+
+class FakeAsyncDuneClient(FakeDuneClient):
+    """Drop-in for AsyncDuneClient, reporting the same execution states as Dune.
+
+    execute / wait / fetch_dataframe follow AsyncDuneClient too, so the
+    DuneScheduler's pacing, tier choice and credit booking run against it.
+    """
+
+    async def execute(self, query, performance='medium'):
+        return self._submit(query)
+
+    async def wait(self, execution_id, on_state=None, query_id=None):
+        for state in ('QUERY_STATE_PENDING', 'QUERY_STATE_EXECUTING'):
+            if on_state is not None:
+                on_state(state)
+            await asyncio.sleep(self.latency / 2)
+        if on_state is not None:
+            on_state('QUERY_STATE_COMPLETED')
+        return {'execution_id': execution_id, 'state': 'QUERY_STATE_COMPLETED'}
+
+    async def fetch_dataframe(self, execution_id, query_id=None):
+        with self._lock:
+            query, _ = self._queries.pop(execution_id)
+        return await asyncio.to_thread(self.result, query)
+
+    async def cancel(self, execution_id):
+        return self._cancel(execution_id)
+
+    async def run_query_dataframe(self, query, performance='medium', on_state=None):
+        execution_id = await self.execute(query, performance=performance)
+        await self.wait(execution_id, on_state=on_state, query_id=query.query_id)
+        return await self.fetch_dataframe(execution_id, query_id=query.query_id)
+
+    async def aclose(self):
+        pass
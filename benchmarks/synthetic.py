@@ -0,0 +1,82 @@
+import numpy as np
+import pandas as pd
+
+
+def transaction_frame(rows, delta_column='delta_eth', seed=0):
+    """Build a transaction_df shaped like the Dune transaction query output."""
+    rng = np.random.default_rng(seed)
+    spent_amount = rng.uniform(0, 5, rows)
+    spent_amount[::7] = 0
+    earned_amount = rng.uniform(0, 6, rows)
+    delta = earned_amount - spent_amount
+    safe_spent = np.where(spent_amount > 0, spent_amount, 1)
+    delta_percentage = np.where(spent_amount > 0, delta / safe_spent * 100, -100)
+    return pd.DataFrame({
+        'token_symbol': [f'TKN{i}' for i in range(rows)],
+        'time_traded': rng.choice(['0s', '12m 5s', '3h 1m 9s', '2d 4h 0m 1s'], rows),
+        'incoming': rng.uniform(0, 1e6, rows),
+        'outcome': rng.uniform(0, 1e6, rows),
+        'delta_token': rng.uniform(-1e5, 1e5, rows),
+        'spent_amount': spent_amount,
+        'earned_amount': earned_amount,
+        'number_buys': rng.integers(0, 20, rows),
+        'number_sells': rng.integers(0, 20, rows),
+        delta_column: delta,
+        'delta_percentage': delta_percentage,
+        'dexscreener': [f'https://dexscreener.com/ethereum/0x{i:040x}?maker=0x{seed:040x}' for i in range(rows)],
+        'block_time': ['01.02.2024'] * rows,
+    })
+
+
+def summary_frame(wallet_address='0x' + '0' * 40):
+    """Build a one-row summary_df shaped like the Dune summary query output."""
+    return pd.DataFrame([{
+        'id': wallet_address,
+        'number_of_tokens_traded': 3,
+        'total_spent_amount': 10.0,
+        'actual_profit': 1.5,
+        'pnl_r': 6.0,
+        'pnl_l': -4.5,
+        'win_rate': 50.0,
+        'loss_rate': 40.0,
+        'time_period_days': '-30',
+    }])
+
+
+def daily_frame(tokens, spec, wallet_address, seed=0, days=3):
+    """Build daily aggregate buckets (pnl_aggregates.AGGREGATE_COLUMNS) for `tokens` tokens over the last `days` days.
+
+    Rolled up with build_transaction_df this gives each chain's exact
+    transaction query output, so one generator serves all three chains.
+    """
+    rng = np.random.default_rng(seed)
+    rows = tokens * days
+    token_index = np.repeat(np.arange(tokens), days)
+    today = pd.Timestamp.now(tz='UTC').normalize().tz_localize(None)
+    dates = today - pd.to_timedelta(np.tile(np.arange(days), tokens), unit='D')
+    first = dates + pd.to_timedelta(rng.integers(0, 43200, rows), unit='s')
+    last = first + pd.to_timedelta(rng.integers(0, 43200, rows), unit='s')
+    buys = rng.integers(0, 5, rows)
+    sells = rng.integers(0, 5, rows)
+    spent = rng.uniform(0, 2, rows) * (buys > 0)
+    earned = rng.uniform(0, 2.4, rows) * (sells > 0)
+    if spec['address_case_sensitive']:
+        addresses = np.char.add('Mint', np.char.mod('%040d', token_index))
+    else:
+        addresses = np.char.add('0x', np.char.mod('%040x', token_index))
+    return pd.DataFrame({
+        'token_symbol': np.char.add('TKN', token_index.astype(str)),
+        'token_address': addresses,
+        'maker': wallet_address,
+        'block_date': dates.strftime('%Y-%m-%d'),
+        'incoming': rng.uniform(0, 1e6, rows) * (buys > 0),
+        'outcome': rng.uniform(0, 1e6, rows) * (sells > 0),
+        'spent_amount': spent,
+        'earned_amount': earned,
+        'spent_usd': spent * 3000,
+        'earned_usd': earned * 3000,
+        'number_buys': buys,
+        'number_sells': sells,
+        'first_block_time': first.strftime('%Y-%m-%d %H:%M:%S.%f').str[:-3],
+        'last_block_time': last.strftime('%Y-%m-%d %H:%M:%S.%f').str[:-3],
+    })
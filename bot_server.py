@@ -0,0 +1,48 @@
+import logging
+import os
+from urllib.parse import urlparse
+
+from telegram.ext import Application
+
+logger = logging.getLogger(__name__)
+
+
+def application_builder(token):
+    """Application builder for the bots, handling up to TELEGRAM_CONCURRENT_UPDATES (default 32) updates at once.
+
+    Without this python-telegram-bot runs handlers one update at a time, so a
+    slow handler holds up every other user's button presses.
+    """
+    limit = max(1, int(os.getenv('TELEGRAM_CONCURRENT_UPDATES', '32')))
+    return Application.builder().token(token).concurrent_updates(limit)
+
+
+def run_application(application, **kwargs):
+    """Serve updates through a webhook when TELEGRAM_WEBHOOK_URL is set, otherwise by long polling.
+
+    TELEGRAM_WEBHOOK_URL is the public https URL Telegram posts to; its path
+    is served on TELEGRAM_WEBHOOK_LISTEN:TELEGRAM_WEBHOOK_PORT (default
+    0.0.0.0:8443), usually behind a TLS-terminating proxy that can spread
+    updates over several workers. TELEGRAM_WEBHOOK_SECRET, when set, is
+    checked on every request. kwargs (allowed_updates, drop_pending_updates)
+    go to either mode.
+
+    On SIGINT/SIGTERM both modes stop taking updates and wait for the handlers
+    already running before post_shutdown runs.
+    """
+    webhook_url = os.getenv('TELEGRAM_WEBHOOK_URL')
+    if not webhook_url:
+        application.run_polling(**kwargs)
+        return
+
+    listen = os.getenv('TELEGRAM_WEBHOOK_LISTEN', '0.0.0.0')
+    port = int(os.getenv('TELEGRAM_WEBHOOK_PORT', '8443'))
+    logger.info(f'Serving webhook {webhook_url} on {listen}:{port}')
+    application.run_webhook(
+        listen=listen,
+        port=port,
+        url_path=urlparse(webhook_url).path.lstrip('/'),
+        webhook_url=webhook_url,
+        secret_token=os.getenv('TELEGRAM_WEBHOOK_SECRET') or None,
+        **kwargs,
+    )
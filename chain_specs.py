@@ -0,0 +1,117 @@
+import re
+
+
+def is_valid_evm_address(address):
+    """Check if the given string is a valid EVM address."""
+    return bool(re.match(r'^0x[a-fA-F0-9]{40}$', address))
+
+def is_valid_solana_address(address):
+    """Basic check for Solana address format."""
+    return 32 <= len(address) <= 44 and address.isalnum()
+
+# Everything that differs between chains. Adding a chain means adding its Dune
+# queries under DuneQueries/ and an entry here.
+#   aggregate_query_id: Dune id of the chain's daily_aggregates.sql; None disables incremental
+#       refreshes (override with <CHAIN>_AGGREGATE_QUERY_ID, e.g. ETH_AGGREGATE_QUERY_ID)
+#   batch_query_id: Dune id of the chain's daily_aggregates_batch.sql used by batch_report.py
+#       (override with <CHAIN>_BATCH_QUERY_ID)
+#   excluded_token_symbol, dexscreener_slug: the final WHERE and dexscreener URL of transaction.sql
+#   quote_symbol, maker_column, token_address_source, address_case_sensitive: how transaction.sql
+#       reads raw trade rows; token_address_source 'mint' takes the non-native side's mint address
+#   transaction_columns: (output column, derived value) pairs rebuilding transaction.sql's output
+#       from daily aggregates; Dune's duplicate time_traded column arrives as 'time_traded.1'
+#   summary_columns: output of the chain's summary_tx.sql, in order
+#   actual_profit_includes_losses: whether summary_tx.sql subtracts pnl_l in actual_profit
+CHAIN_SPECS = {
+    'eth': {
+        'name': 'Ethereum',
+        'emoji': '🔵',
+        'native_symbol': 'ETH',
+        'transaction_query_id': 4955925,
+        'summary_query_id': 4955940,
+        'aggregate_query_id': None,
+        'batch_query_id': None,
+        'delta_column': 'delta_eth',
+        'excluded_token_symbol': 'ETH',
+        'quote_symbol': 'WETH',
+        'maker_column': 'tx_from',
+        'token_address_source': 'project_contract_address',
+        'address_case_sensitive': False,
+        'dexscreener_slug': 'ethereum',
+        'transaction_columns': [
+            ('token_symbol', 'token_symbol'), ('time_traded', 'time_traded_seconds'), ('incoming', 'incoming'),
+            ('outcome', 'outcome'), ('delta_token', 'delta_token'), ('spent_amount', 'spent_amount'),
+            ('earned_amount', 'earned_amount'), ('number_buys', 'number_buys'), ('number_sells', 'number_sells'),
+            ('delta_eth', 'delta'), ('delta_percentage', 'delta_percentage'), ('dexscreener', 'dexscreener'),
+            ('block_time', 'first_trade_date'), ('time_traded.1', 'time_traded_text'),
+            ('spent_usd', 'spent_usd'), ('earned_usd', 'earned_usd'),
+        ],
+        'address_validator': is_valid_evm_address,
+        'summary_columns': [
+            'id', 'number_of_tokens_traded', 'total_spent_amount', 'actual_profit', 'pnl_r', 'pnl_l',
+            'win_rate', 'loss_rate', 'weighted_win_rate', 'weighted_loss_rate', 'profitability_index',
+            'avg_profit_per_win', 'avg_loss_per_loss', 'time_period_days',
+        ],
+        'actual_profit_includes_losses': False,
+    },
+    'bnb': {
+        'name': 'Binance Smart Chain',
+        'emoji': '🟡',
+        'native_symbol': 'BNB',
+        'transaction_query_id': 3809198,
+        'summary_query_id': 3833031,
+        'aggregate_query_id': None,
+        'batch_query_id': None,
+        'delta_column': 'delta_bnb',
+        'excluded_token_symbol': 'WBNB',
+        'quote_symbol': 'WBNB',
+        'maker_column': 'tx_from',
+        'token_address_source': 'project_contract_address',
+        'address_case_sensitive': False,
+        'dexscreener_slug': 'bsc',
+        'transaction_columns': [
+            ('token_symbol', 'token_symbol'), ('time_traded', 'time_traded_seconds'), ('incoming', 'incoming'),
+            ('outcome', 'outcome'), ('delta_token', 'delta_token'), ('spent_amount', 'spent_amount'),
+            ('earned_amount', 'earned_amount'), ('number_buys', 'number_buys'), ('number_sells', 'number_sells'),
+            ('delta_bnb', 'delta'), ('delta_percentage', 'delta_percentage'), ('dexscreener', 'dexscreener'),
+            ('block_time', 'first_trade_date'), ('time_traded.1', 'time_traded_text'),
+            ('spent_usd', 'spent_usd'), ('earned_usd', 'earned_usd'),
+        ],
+        'address_validator': is_valid_evm_address,
+        'summary_columns': [
+            'id', 'number_of_tokens_traded', 'total_spent_amount', 'actual_profit', 'pnl_r', 'pnl_l',
+            'loss_rate', 'win_rate', 'time_period_days',
+        ],
+        'actual_profit_includes_losses': True,
+    },
+    'sol': {
+        'name': 'Solana',
+        'emoji': '🟣',
+        'native_symbol': 'SOL',
+        'transaction_query_id': 4335631,
+        'summary_query_id': 4338488,
+        'aggregate_query_id': None,
+        'batch_query_id': None,
+        'delta_column': 'delta_sol',
+        'excluded_token_symbol': 'SOL',
+        'quote_symbol': 'SOL',
+        'maker_column': 'trader_id',
+        'token_address_source': 'mint',
+        'address_case_sensitive': True,
+        'dexscreener_slug': 'solana',
+        'transaction_columns': [
+            ('token_symbol', 'token_symbol'), ('time_traded', 'time_traded_text'), ('incoming', 'incoming'),
+            ('outcome', 'outcome'), ('delta_token', 'delta_token'), ('spent_amount', 'spent_amount'),
+            ('earned_amount', 'earned_amount'), ('number_buys', 'number_buys'), ('number_sells', 'number_sells'),
+            ('delta_sol', 'delta'), ('delta_percentage', 'delta_percentage'), ('dexscreener', 'dexscreener'),
+            ('block_time', 'first_trade_date'), ('spent_usd', 'spent_usd'), ('earned_usd', 'earned_usd'),
+        ],
+        'address_validator': is_valid_solana_address,
+        'summary_columns': [
+            'id', 'number_of_tokens_traded', 'total_spent_amount', 'actual_profit', 'pnl_r', 'pnl_l',
+            'win_rate', 'loss_rate', 'weighted_win_rate', 'weighted_loss_rate', 'profitability_index',
+            'avg_profit_per_win', 'avg_loss_per_loss', 'trade_efficiency', 'time_period_days',
+        ],
+        'actual_profit_includes_losses': True,
+    },
+}
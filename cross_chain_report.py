@@ -0,0 +1,134 @@
+import argparse
+import asyncio
+import io
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from pnl_report import CHAIN_SPECS, PnlReportEngine, format_table_sheet
+
+logger = logging.getLogger(__name__)
+
+CROSS_CHAIN_SHEET = 'Cross-chain'
+USD_SUMMARY_COLUMNS = [
+    'chain', 'wallet', 'number_of_tokens_traded', 'spent_usd', 'earned_usd', 'pnl_usd',
+    'pnl_r_usd', 'pnl_l_usd', 'win_rate', 'loss_rate',
+]
+
+
+def parse_chain_wallets(values):
+    """Turn 'eth:0xabc', 'sol:7xKX...' strings into (chain, wallet) pairs, checking every address."""
+    pairs = []
+    for value in values:
+        chain, _, wallet = value.strip().partition(':')
+        chain = chain.lower()
+        if chain not in CHAIN_SPECS or not wallet:
+            raise ValueError(f"Expected <{'|'.join(CHAIN_SPECS)}>:<wallet>, got {value!r}")
+        if not CHAIN_SPECS[chain]['address_validator'](wallet):
+            raise ValueError(f"Invalid {CHAIN_SPECS[chain]['name']} wallet address: {wallet}")
+        pairs.append((chain, wallet))
+    if not pairs:
+        raise ValueError('No chain:wallet pairs given.')
+    return list(dict.fromkeys(pairs))
+
+
+def usd_summary_row(chain, wallet, transaction_df):
+    """Per-chain PnL in USD from the spent_usd/earned_usd (amount_usd) sums of each token."""
+    if 'spent_usd' not in transaction_df.columns:
+        # Published Dune query predates the USD columns
+        logger.warning(f'No USD columns in the {chain} transaction query results; republish transaction.sql')
+        spent = earned = np.full(len(transaction_df), np.nan)
+    else:
+        spent = transaction_df['spent_usd'].to_numpy(dtype=float)
+        earned = transaction_df['earned_usd'].to_numpy(dtype=float)
+    delta = earned - spent
+    count = len(transaction_df)
+    return {
+        'chain': chain,
+        'wallet': wallet,
+        'number_of_tokens_traded': transaction_df['token_symbol'].nunique(),
+        'spent_usd': spent.sum(),
+        'earned_usd': earned.sum(),
+        'pnl_usd': delta.sum(),
+        'pnl_r_usd': delta[delta > 0].sum(),
+        'pnl_l_usd': delta[delta < 0].sum(),
+        'win_rate': (delta > 0).sum() / count * 100 if count else np.nan,
+        'loss_rate': (delta < 0).sum() / count * 100 if count else np.nan,
+    }
+
+
+class CrossChainReport:
+    """One owner's wallets on several chains, fetched in parallel and merged into one USD view.
+
+    Each (chain, wallet) is an ordinary PnlReportEngine; their Dune work runs
+    concurrently, so the report takes about as long as the slowest chain.
+    Native amounts are not comparable across chains, so the merged view sums
+    the amount_usd of every swap instead.
+    """
+
+    def __init__(self, pairs, day='-30', user=None):
+        self.day = day
+        self.reports = []
+        for chain, wallet in pairs:
+            self.reports.append(PnlReportEngine(chain, wallet, day=day, user=user))
+        self.reports_folder = "reports"
+        self.output_file_path = os.path.join(self.reports_folder, f"cross_chain_{self.reports[0].wallet_address}.xlsx")
+        self.usd_summary_df = None
+
+    def fetch_data(self):
+        with ThreadPoolExecutor(max_workers=len(self.reports)) as executor:
+            list(executor.map(lambda report: report.fetch_data(), self.reports))
+        self._build_usd_summary()
+
+    async def fetch_data_async(self):
+        await asyncio.gather(*(report.fetch_data_async() for report in self.reports))
+        self._build_usd_summary()
+
+    def _build_usd_summary(self):
+        rows = [usd_summary_row(report.chain, report.wallet_address, report.transaction_df) for report in self.reports]
+        all_transactions = pd.concat([report.transaction_df for report in self.reports], ignore_index=True)
+        total = usd_summary_row('all', f'{len(self.reports)} wallets', all_transactions)
+        # Token symbols can repeat across chains, so count them per chain
+        total['number_of_tokens_traded'] = sum(row['number_of_tokens_traded'] for row in rows)
+        self.usd_summary_df = pd.DataFrame(rows + [total], columns=USD_SUMMARY_COLUMNS)
+
+    @staticmethod
+    def sheet_name(chain, wallet):
+        return f"{chain.upper()} {wallet[:6]}..{wallet[-4:]}"
+
+    def save_to_excel(self, target=None):
+        """Write the USD overview followed by each chain's usual report sheet."""
+        if target is None:
+            os.makedirs(self.reports_folder, exist_ok=True)
+            target = self.output_file_path
+        with pd.ExcelWriter(target, engine='openpyxl') as writer:
+            self.usd_summary_df.to_excel(writer, sheet_name=CROSS_CHAIN_SHEET, index=False)
+            format_table_sheet(writer.sheets[CROSS_CHAIN_SHEET])
+            for report in self.reports:
+                report.write_sheet(writer, sheet_name=self.sheet_name(report.chain, report.wallet_address))
+        if isinstance(target, str):
+            print(f'Cross-chain report for {len(self.reports)} wallets has been saved to {target}')
+
+    def render_report_bytes(self):
+        buffer = io.BytesIO()
+        self.save_to_excel(buffer)
+        return buffer.getvalue()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='One PnL workbook across ETH, BNB and SOL wallets, normalized to USD.')
+    parser.add_argument('pairs', nargs='+', help='chain:wallet, e.g. eth:0xabc... sol:7xKX...')
+    parser.add_argument('--day', default='-30', help='window start relative to today, as in the Dune queries')
+    parser.add_argument('--output', help='xlsx path')
+    args = parser.parse_args()
+
+    report = CrossChainReport(parse_chain_wallets(args.pairs), day=args.day)
+    report.fetch_data()
+    report.save_to_excel(args.output)
+
+
+if __name__ == "__main__":
+    main()
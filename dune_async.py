@@ -0,0 +1,118 @@
+import asyncio
+import io
+import logging
+import time
+
+import httpx
+import pandas as pd
+from dune_client.models import QueryFailed
+
+from dune_scheduler import RATE_LIMIT_RETRIES, backoff_delay
+from instrumentation import record, span
+
+logger = logging.getLogger(__name__)
+
+TERMINAL_FAILURE_STATES = {'QUERY_STATE_FAILED', 'QUERY_STATE_CANCELLED', 'QUERY_STATE_EXPIRED'}
+COMPLETED_STATE = 'QUERY_STATE_COMPLETED'
+NEXT_URI_HEADER = 'x-dune-next-uri'
+# Time spent in these states is recorded as the dune_queue / dune_execute stages
+STATE_STAGES = {'QUERY_STATE_PENDING': 'dune_queue', 'QUERY_STATE_EXECUTING': 'dune_execute'}
+
+
+class AsyncDuneClient:
+    """asyncio version of the Dune execute -> poll -> fetch cycle, built on httpx.
+
+    A waiting report holds no thread, only a sleeping coroutine, so one event
+    loop can keep hundreds of executions in flight. run_query_dataframe matches
+    DuneClient.run_query_dataframe, so callers can use either client.
+    """
+
+    def __init__(self, api_key, base_url="https://api.dune.com", request_timeout=10, pool_size=10,
+                 poll_interval=1.0, max_poll_interval=10.0):
+        self.base_url = base_url
+        self.poll_interval = poll_interval
+        self.max_poll_interval = max_poll_interval
+        self.http = httpx.AsyncClient(
+            base_url=f"{base_url}/api/v1",
+            headers={"x-dune-api-key": api_key},
+            timeout=request_timeout,
+            limits=httpx.Limits(max_connections=pool_size, max_keepalive_connections=pool_size),
+        )
+
+    async def _request(self, method, url, **kwargs):
+        """Send one request, retrying 429s up to DUNE_RATE_LIMIT_RETRIES times with jittered backoff."""
+        for attempt in range(RATE_LIMIT_RETRIES + 1):
+            response = await self.http.request(method, url, **kwargs)
+            if response.status_code != 429 or attempt == RATE_LIMIT_RETRIES:
+                break
+            delay = backoff_delay(attempt, response.headers.get('retry-after'))
+            logger.warning(f'Dune rate limited {method} {url}; retrying in {delay:.1f}s')
+            record('dune_rate_limited', delay)
+            await asyncio.sleep(delay)
+        response.raise_for_status()
+        return response
+
+    async def execute(self, query, performance='medium'):
+        """Submit query and return its execution id."""
+        params = query.request_format()
+        params['performance'] = performance or 'medium'
+        logger.info(f"executing {query.query_id} on {params['performance']} cluster")
+        with span('dune_submit', query_id=query.query_id):
+            response = await self._request('POST', f'/query/{query.query_id}/execute', json=params)
+        return response.json()['execution_id']
+
+    async def wait(self, execution_id, on_state=None, query_id=None):
+        """Poll with exponential backoff until the execution finishes; on_state(state) sees each new state."""
+        delay = self.poll_interval
+        last_state = None
+        state_since = time.perf_counter()
+        while True:
+            response = await self._request('GET', f'/execution/{execution_id}/status')
+            status = response.json()
+            state = status['state']
+            if state != last_state:
+                # Polling granularity bounds the accuracy of the per-state times
+                now = time.perf_counter()
+                if last_state in STATE_STAGES:
+                    record(STATE_STAGES[last_state], now - state_since, query_id=query_id)
+                last_state, state_since = state, now
+                if on_state is not None:
+                    on_state(state)
+            if state == COMPLETED_STATE:
+                return status
+            if state in TERMINAL_FAILURE_STATES:
+                raise QueryFailed(f"Error data: {status.get('error')}")
+            await asyncio.sleep(delay)
+            delay = min(delay * 1.5, self.max_poll_interval)
+
+    async def cancel(self, execution_id):
+        """Cancel a pending or running execution; returns whether Dune accepted the cancellation."""
+        try:
+            response = await self._request('POST', f'/execution/{execution_id}/cancel')
+        except httpx.HTTPError as e:
+            logger.warning(f'Could not cancel Dune execution {execution_id}: {e}')
+            return False
+        return bool(response.json().get('success'))
+
+    async def fetch_dataframe(self, execution_id, query_id=None):
+        """Download every page of the CSV results for a finished execution."""
+        frames = []
+        url = f'/execution/{execution_id}/results/csv'
+        with span('dune_download', query_id=query_id) as stage:
+            stage.nbytes = 0
+            while url:
+                response = await self._request('GET', url)
+                stage.nbytes += len(response.content)
+                frames.append(pd.read_csv(io.StringIO(response.text)))
+                url = response.headers.get(NEXT_URI_HEADER)
+            df = pd.concat(frames, ignore_index=True) if len(frames) > 1 else frames[0]
+            stage.rows = len(df)
+        return df
+
+    async def run_query_dataframe(self, query, performance='medium', on_state=None):
+        execution_id = await self.execute(query, performance=performance)
+        await self.wait(execution_id, on_state=on_state, query_id=query.query_id)
+        return await self.fetch_dataframe(execution_id, query_id=query.query_id)
+
+    async def aclose(self):
+        await self.http.aclose()
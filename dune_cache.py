@@ -0,0 +1,171 @@
+import asyncio
+import hashlib
+import logging
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+
+class QueryResultCache:
+    """TTL + LRU cache of Dune query results keyed by query id and parameters.
+
+    Results live in memory and, when cache_dir is set, also as Parquet files so
+    warm entries survive bot restarts. The disk tier needs pyarrow (or
+    fastparquet) and is switched off with a warning when neither is installed.
+    """
+
+    def __init__(self, ttl_seconds=900, max_entries=128, cache_dir=None):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.cache_dir = cache_dir
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        if self.cache_dir:
+            os.makedirs(self.cache_dir, exist_ok=True)
+
+    @staticmethod
+    def make_key(query):
+        params = tuple(sorted(query.request_format().get('query_parameters', {}).items()))
+        return (query.query_id, params)
+
+    def _disk_path(self, key):
+        digest = hashlib.sha1(repr(key).encode()).hexdigest()
+        return os.path.join(self.cache_dir, f"{key[0]}_{digest}.parquet")
+
+    def _expired(self, stored_at):
+        return time.time() - stored_at > self.ttl_seconds
+
+    def get(self, query):
+        """Return a copy of the cached result for query, or None on a miss."""
+        if self.ttl_seconds <= 0:
+            return None
+        key = self.make_key(query)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                stored_at, df = entry
+                if not self._expired(stored_at):
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return df.copy()
+                del self._entries[key]
+
+        df, stored_at = self._read_disk(key)
+        with self._lock:
+            if df is None:
+                self.misses += 1
+                return None
+            self.disk_hits += 1
+            self._store(key, df, stored_at)
+        return df.copy()
+
+    def put(self, query, df):
+        if self.ttl_seconds <= 0:
+            return
+        key = self.make_key(query)
+        with self._lock:
+            self._store(key, df.copy(), time.time())
+        self._write_disk(key, df)
+
+    def _store(self, key, df, stored_at):
+        self._entries[key] = (stored_at, df)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def _read_disk(self, key):
+        """(result, mtime) of the cached file for key, or (None, None) when there is no fresh one."""
+        if not self.cache_dir:
+            return None, None
+        path = self._disk_path(key)
+        try:
+            stored_at = os.path.getmtime(path)
+            if self._expired(stored_at):
+                os.remove(path)
+                return None, None
+            return pd.read_parquet(path), stored_at
+        except FileNotFoundError:
+            return None, None
+        except Exception as e:
+            logger.warning(f'Ignoring unreadable cache file {path}: {e}')
+            return None, None
+
+    def _write_disk(self, key, df):
+        """Best effort: the result is already cached in memory, so a failed write only costs the disk copy."""
+        if not self.cache_dir:
+            return
+        path = self._disk_path(key)
+        # Write to a file of our own, then rename, so concurrent writers of one key never share
+        # a temp file and a reader never sees a partial one
+        tmp_path = None
+        try:
+            with tempfile.NamedTemporaryFile(dir=self.cache_dir, suffix='.tmp', delete=False) as tmp:
+                tmp_path = tmp.name
+            df.to_parquet(tmp_path, index=False)
+            os.replace(tmp_path, path)
+        except ImportError as e:
+            logger.warning(f'Disabling on-disk Dune cache: {e}')
+            self.cache_dir = None
+        except Exception as e:
+            logger.warning(f'Could not write cache file {path}: {e}')
+        finally:
+            if tmp_path and os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    def run_query_dataframe(self, dune, query, performance=None):
+        """Drop-in for DuneClient.run_query_dataframe that serves fresh cached results first."""
+        df = self.get(query)
+        if df is not None:
+            logger.info(f'Dune cache hit for query {query.query_id}')
+            return df
+        df = dune.run_query_dataframe(query, performance=performance)
+        self.put(query, df)
+        return df
+
+    async def run_query_dataframe_async(self, dune, query, performance=None, on_state=None):
+        """Async variant of run_query_dataframe for an AsyncDuneClient; disk cache I/O stays off the loop."""
+        df = await asyncio.to_thread(self.get, query)
+        if df is not None:
+            logger.info(f'Dune cache hit for query {query.query_id}')
+            return df
+        df = await dune.run_query_dataframe(query, performance=performance, on_state=on_state)
+        await asyncio.to_thread(self.put, query, df)
+        return df
+
+    def stats(self):
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'disk_hits': self.disk_hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'entries': len(self._entries),
+            }
+
+
+_query_cache = None
+_query_cache_lock = threading.Lock()
+
+
+def get_query_cache():
+    """Return the process-wide cache, configured from DUNE_CACHE_TTL, DUNE_CACHE_SIZE and DUNE_CACHE_DIR."""
+    global _query_cache
+    with _query_cache_lock:
+        if _query_cache is None:
+            _query_cache = QueryResultCache(
+                ttl_seconds=int(os.getenv('DUNE_CACHE_TTL', '900')),
+                max_entries=int(os.getenv('DUNE_CACHE_SIZE', '128')),
+                cache_dir=os.getenv('DUNE_CACHE_DIR') or None,
+            )
+        return _query_cache
@@ -0,0 +1,101 @@
+import asyncio
+import os
+import threading
+
+from dotenv import load_dotenv
+from dune_client.client import DuneClient
+from requests.adapters import HTTPAdapter
+
+from dune_async import AsyncDuneClient
+from dune_scheduler import RATE_LIMIT_RETRIES, RETRY_BASE_SECONDS, RETRY_MAX_SECONDS
+
+_clients = {}
+_clients_lock = threading.Lock()
+_async_clients = {}
+
+
+def get_dune_client(api_key=None, base_url="https://api.dune.com", request_timeout=None):
+    """Return the process-wide DuneClient for these settings, creating it on first use.
+
+    Every report shares the client's requests session, so HTTP keep-alive
+    connections to Dune are reused instead of opening a new TLS session per
+    report. DUNE_POOL_SIZE (default 10) sets how many idle connections are kept.
+    """
+    with _clients_lock:
+        if not _clients:
+            load_dotenv()
+        api_key = api_key or os.getenv('DUNE_API_KEY')
+        request_timeout = request_timeout or int(os.getenv('DUNE_API_REQUEST_TIMEOUT', '10'))
+        key = (api_key, base_url, request_timeout)
+        client = _clients.get(key)
+        if client is None:
+            client = DuneClient(api_key=api_key, base_url=base_url, request_timeout=request_timeout)
+            pool_size = int(os.getenv('DUNE_POOL_SIZE', '10'))
+            # Keep dune_client's retry policy (429 and 5xx, honouring Retry-After) with our
+            # jittered backoff, so throttled reports do not retry in lockstep; widen the pool
+            retries = client.http.get_adapter(base_url).max_retries.new(
+                total=RATE_LIMIT_RETRIES, backoff_factor=RETRY_BASE_SECONDS / 2,
+                backoff_max=RETRY_MAX_SECONDS, backoff_jitter=RETRY_BASE_SECONDS,
+            )
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=retries)
+            client.http.mount("https://", adapter)
+            client.http.mount("http://", adapter)
+            _clients[key] = client
+        return client
+
+
+def get_async_dune_client(api_key=None, base_url="https://api.dune.com", request_timeout=None):
+    """Return the shared AsyncDuneClient for the running event loop.
+
+    httpx connection pools belong to one event loop, so there is one client per
+    loop. DUNE_POOL_SIZE sets its connection limit too. Close them with
+    close_async_dune_clients before the loop stops.
+    """
+    loop = asyncio.get_running_loop()
+    with _clients_lock:
+        if not _clients and not _async_clients:
+            load_dotenv()
+    api_key = api_key or os.getenv('DUNE_API_KEY')
+    request_timeout = request_timeout or int(os.getenv('DUNE_API_REQUEST_TIMEOUT', '10'))
+    key = (loop, api_key, base_url, request_timeout)
+    client = _async_clients.get(key)
+    if client is None:
+        pool_size = int(os.getenv('DUNE_POOL_SIZE', '10'))
+        client = AsyncDuneClient(api_key, base_url=base_url, request_timeout=request_timeout, pool_size=pool_size)
+        _async_clients[key] = client
+    return client
+
+
+async def close_async_dune_clients():
+    """Close the shared AsyncDuneClients of the running event loop and forget them.
+
+    Clients of loops that have already closed cannot be closed any more; they are dropped.
+    """
+    loop = asyncio.get_running_loop()
+    with _clients_lock:
+        keys = [key for key in _async_clients if key[0] is loop or key[0].is_closed()]
+        clients = [(key[0], _async_clients.pop(key)) for key in keys]
+    for client_loop, client in clients:
+        if client_loop is loop:
+            await client.aclose()
+
+
+def connection_stats():
+    """Count HTTP requests made by the shared clients and how many of them reused a pooled connection."""
+    requests_made = 0
+    new_connections = 0
+    with _clients_lock:
+        clients = list(_clients.values())
+    for client in clients:
+        adapter = client.http.get_adapter(client.base_url)
+        for pool_key in list(adapter.poolmanager.pools.keys()):
+            pool = adapter.poolmanager.pools.get(pool_key)
+            if pool is not None:
+                requests_made += pool.num_requests
+                new_connections += pool.num_connections
+    return {
+        'dune_clients': len(clients),
+        'http_requests': requests_made,
+        'new_connections': new_connections,
+        'reused_connections': max(requests_made - new_connections, 0),
+    }
@@ -0,0 +1,243 @@
+import asyncio
+import logging
+import os
+import random
+import threading
+import time
+
+import httpx
+import pandas as pd
+import requests
+from dune_client.api.extensions import MAX_NUM_ROWS_PER_BATCH, POLL_FREQUENCY_SECONDS
+from dune_client.models import ExecutionState, QueryFailed
+
+from instrumentation import span
+from state_store import get_state_store
+
+logger = logging.getLogger(__name__)
+
+PERFORMANCE_TIERS = ('medium', 'large')
+# Jittered backoff for Dune 429 responses, shared by the sync and async clients
+RATE_LIMIT_RETRIES = int(os.getenv('DUNE_RATE_LIMIT_RETRIES', '6'))
+RETRY_BASE_SECONDS = float(os.getenv('DUNE_RETRY_BASE_SECONDS', '1'))
+RETRY_MAX_SECONDS = float(os.getenv('DUNE_RETRY_MAX_SECONDS', '60'))
+RATE_LIMITED_MESSAGE = 'Dune is rate limiting us right now. Please try again in a few minutes.'
+
+
+class DuneRateLimitError(RuntimeError):
+    """Dune kept answering 429 after every retry."""
+
+
+class ExecutionAbandonedError(RuntimeError):
+    """The report no longer needs this execution, so it was cancelled on Dune (or never submitted)."""
+
+
+def backoff_delay(attempt, retry_after=None):
+    """Seconds to wait before retry number attempt (0-based) of a rate-limited request.
+
+    Full jitter: a random delay up to RETRY_BASE_SECONDS * 2**attempt, capped at
+    RETRY_MAX_SECONDS, so reports that were throttled together do not all come
+    back at the same moment. Never shorter than the server's Retry-After.
+    """
+    delay = random.uniform(0, min(RETRY_MAX_SECONDS, RETRY_BASE_SECONDS * 2 ** attempt))
+    try:
+        return max(delay, float(retry_after)) if retry_after else delay
+    except ValueError:
+        # Retry-After can also be an HTTP date; the exponential delay will do
+        return delay
+
+
+def is_rate_limited(error):
+    """Whether error is a 429 that outlasted the client's retries (requests or httpx)."""
+    if isinstance(error, httpx.HTTPStatusError):
+        return error.response.status_code == 429
+    if isinstance(error, requests.exceptions.RetryError):
+        return '429' in str(error)
+    return False
+
+
+class TokenBucket:
+    """Allows rate_per_minute acquisitions per minute on average, with bursts of up to burst.
+
+    A caller reserves a token even when the bucket is empty and then sleeps
+    until it is due, so waiters are served in arrival order without polling.
+    Safe to share between threads and event loops.
+    """
+
+    def __init__(self, rate_per_minute, burst):
+        self.rate = rate_per_minute / 60
+        self.burst = burst
+        self._tokens = burst
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self):
+        """Take a token and return how many seconds to wait before using it."""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= 1
+            return max(-self._tokens / self.rate, 0.0)
+
+    def acquire(self):
+        delay = self.reserve()
+        if delay:
+            time.sleep(delay)
+
+    async def acquire_async(self):
+        delay = self.reserve()
+        if delay:
+            await asyncio.sleep(delay)
+
+
+class DuneScheduler:
+    """Paces Dune submissions, picks the performance tier and books the credits each execution costs.
+
+    Every execution in the process takes a token from one bucket refilled at
+    DUNE_SUBMITS_PER_MINUTE (default 15) with bursts of DUNE_SUBMIT_BURST
+    (default 5). Each worker process has its own bucket, so split the plan's
+    limit between workers. Wallets whose last report had at least
+    DUNE_LARGE_TIER_TRADES (default 5000) trades run on the large tier. The
+    credits Dune reports for an execution, or DUNE_<TIER>_CREDITS (10 for
+    medium, 20 for large) when it does not, are booked in the StateStore per
+    user and chain.
+    """
+
+    def __init__(self, store, submits_per_minute=None, burst=None, large_tier_trades=None):
+        self.store = store
+        self.bucket = TokenBucket(
+            submits_per_minute or float(os.getenv('DUNE_SUBMITS_PER_MINUTE', '15')),
+            burst or int(os.getenv('DUNE_SUBMIT_BURST', '5')),
+        )
+        self.large_tier_trades = large_tier_trades or int(os.getenv('DUNE_LARGE_TIER_TRADES', '5000'))
+        self.tier_credits = {tier: float(os.getenv(f'DUNE_{tier.upper()}_CREDITS', default))
+                             for tier, default in zip(PERFORMANCE_TIERS, ('10', '20'))}
+
+    def expected_trades(self, chain, wallets):
+        """Trades the wallets had in their last reports; wallets never reported count as 0."""
+        return sum(self.store.wallet_activity(chain, wallets).values())
+
+    def record_activity(self, chain, trades):
+        """Remember {wallet: trades} from finished reports for choosing their next tier."""
+        try:
+            self.store.record_wallet_activity(chain, trades)
+        except Exception as e:
+            logger.warning(f'Could not record wallet activity: {e}')
+
+    def choose_performance(self, expected_trades):
+        return 'large' if expected_trades >= self.large_tier_trades else 'medium'
+
+    def client(self, dune, user=None, chain=None, expected_trades=0):
+        """Wrap a DuneClient or AsyncDuneClient so its executions go through this scheduler.
+
+        The wrapper has the same run_query_dataframe as the client it wraps, so
+        it can be handed to QueryResultCache. performance defaults to the tier
+        chosen for expected_trades.
+        """
+        performance = self.choose_performance(expected_trades)
+        wrapper = AsyncScheduledDuneClient if asyncio.iscoroutinefunction(dune.run_query_dataframe) else ScheduledDuneClient
+        return wrapper(self, dune, 'cli' if user is None else user, chain, performance)
+
+    def book(self, user, chain, performance, credits=None):
+        credits = self.tier_credits[performance] if credits is None else float(credits)
+        logger.info(f'Dune execution on {performance} for {user} ({chain}): {credits:g} credits')
+        try:
+            self.store.add_dune_credits(user, chain, performance, credits)
+        except Exception as e:
+            # Bookkeeping must never fail a report that already has its data
+            logger.warning(f'Could not book Dune credits: {e}')
+
+
+class ScheduledDuneClient:
+    """DuneClient stand-in that runs executions through a DuneScheduler on behalf of one user and chain.
+
+    With a cancelled event (see abandonable) executions are polled here instead
+    of in DuneClient, so setting the event cancels them on Dune at the next poll.
+    """
+
+    def __init__(self, scheduler, dune, user, chain, performance, cancelled=None):
+        self.scheduler = scheduler
+        self.dune = dune
+        self.user = user
+        self.chain = chain
+        self.performance = performance
+        self.cancelled = cancelled
+
+    def abandonable(self, cancelled):
+        """This client with its executions cancelled on Dune once cancelled, a threading.Event, is set."""
+        return type(self)(self.scheduler, self.dune, self.user, self.chain, self.performance, cancelled)
+
+    def run_query_dataframe(self, query, performance=None):
+        performance = performance or self.performance
+        with span('dune_throttle', chain=self.chain):
+            self.scheduler.bucket.acquire()
+        try:
+            if self.cancelled is None:
+                df = self.dune.run_query_dataframe(query, performance=performance)
+            else:
+                df = self._run_abandonable(query, performance)
+        except requests.exceptions.RequestException as e:
+            if is_rate_limited(e):
+                raise DuneRateLimitError(RATE_LIMITED_MESSAGE) from e
+            raise
+        self.scheduler.book(self.user, self.chain, performance)
+        return df
+
+    def _run_abandonable(self, query, performance):
+        # DuneClient.run_query_dataframe's execute -> poll -> fetch, checking self.cancelled between polls
+        if self.cancelled.is_set():
+            raise ExecutionAbandonedError(f'Query {query.query_id} not submitted, the report was abandoned')
+        job_id = self.dune.execute_query(query, performance=performance).execution_id
+        status = self.dune.get_execution_status(job_id)
+        while status.state not in ExecutionState.terminal_states():
+            if self.cancelled.wait(POLL_FREQUENCY_SECONDS):
+                self.dune.cancel_execution(job_id)
+                raise ExecutionAbandonedError(f'Execution {job_id} of query {query.query_id} cancelled')
+            status = self.dune.get_execution_status(job_id)
+        if status.state != ExecutionState.COMPLETED:
+            raise QueryFailed(f"Error data: {status.error}")
+        result = self.dune.get_execution_results_csv(job_id, limit=MAX_NUM_ROWS_PER_BATCH)
+        while result.next_offset is not None:
+            result += self.dune.get_execution_results_csv(job_id, limit=MAX_NUM_ROWS_PER_BATCH, offset=result.next_offset)
+        return pd.read_csv(result.data)
+
+
+class AsyncScheduledDuneClient(ScheduledDuneClient):
+    """AsyncDuneClient stand-in; books the credits Dune reports in the execution status.
+
+    Cancelling the task waiting on an execution cancels the execution on Dune.
+    """
+
+    async def run_query_dataframe(self, query, performance=None, on_state=None):
+        performance = performance or self.performance
+        with span('dune_throttle', chain=self.chain):
+            await self.scheduler.bucket.acquire_async()
+        try:
+            execution_id = await self.dune.execute(query, performance=performance)
+            try:
+                status = await self.dune.wait(execution_id, on_state=on_state, query_id=query.query_id)
+            except asyncio.CancelledError:
+                # Nobody will read the result, so stop Dune spending credits on it
+                await self.dune.cancel(execution_id)
+                raise
+            await asyncio.to_thread(self.scheduler.book, self.user, self.chain, performance,
+                                    status.get('execution_cost_credits'))
+            return await self.dune.fetch_dataframe(execution_id, query_id=query.query_id)
+        except httpx.HTTPStatusError as e:
+            if is_rate_limited(e):
+                raise DuneRateLimitError(RATE_LIMITED_MESSAGE) from e
+            raise
+
+
+_dune_scheduler = None
+_dune_scheduler_lock = threading.Lock()
+
+
+def get_dune_scheduler():
+    """Return the process-wide DuneScheduler, booking credits in the shared StateStore."""
+    global _dune_scheduler
+    with _dune_scheduler_lock:
+        if _dune_scheduler is None:
+            _dune_scheduler = DuneScheduler(get_state_store())
+        return _dune_scheduler
@@ -0,0 +1,158 @@
+import json
+import logging
+import os
+import resource
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds (seconds) of the pnl_stage_seconds histogram buckets
+BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+
+def current_rss_bytes():
+    """Resident set size of this process; falls back to peak RSS where /proc is unavailable."""
+    try:
+        with open('/proc/self/statm') as file:
+            return int(file.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError):
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+class SpanRegistry:
+    """Collects report stage timings as Prometheus histograms and, optionally, a JSON-lines log.
+
+    Each stage is identified by its name and labels (chain, query_id, ...), so
+    `histogram_quantile(0.95, ...)` over pnl_stage_seconds shows which stage
+    dominates p95 latency per chain. rows and bytes are summed per stage.
+    """
+
+    def __init__(self, log_path=None):
+        self.log_path = log_path
+        self._lock = threading.Lock()
+        self._stages = {}
+
+    def record(self, name, seconds, labels=None, rows=None, nbytes=None, rss_delta=None):
+        labels = {key: str(value) for key, value in (labels or {}).items()}
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            stage = self._stages.setdefault(key, {'buckets': [0] * len(BUCKETS), 'count': 0, 'sum': 0.0, 'rows': 0, 'bytes': 0})
+            for i, bound in enumerate(BUCKETS):
+                if seconds <= bound:
+                    stage['buckets'][i] += 1
+            stage['count'] += 1
+            stage['sum'] += seconds
+            stage['rows'] += rows or 0
+            stage['bytes'] += nbytes or 0
+            if self.log_path:
+                entry = {'ts': round(time.time(), 3), 'span': name, 'seconds': round(seconds, 6), **labels}
+                for field, value in (('rows', rows), ('bytes', nbytes), ('rss_delta_bytes', rss_delta)):
+                    if value is not None:
+                        entry[field] = value
+                with open(self.log_path, 'a') as file:
+                    file.write(json.dumps(entry) + '\n')
+
+    def prometheus_text(self):
+        with self._lock:
+            stages = {key: {**value, 'buckets': list(value['buckets'])} for key, value in self._stages.items()}
+        lines = [
+            '# HELP pnl_stage_seconds Duration of report pipeline stages.',
+            '# TYPE pnl_stage_seconds histogram',
+        ]
+        counters = [
+            '# HELP pnl_stage_rows_total Rows handled by report pipeline stages.',
+            '# TYPE pnl_stage_rows_total counter',
+        ]
+        byte_counters = [
+            '# HELP pnl_stage_bytes_total Bytes downloaded or written by report pipeline stages.',
+            '# TYPE pnl_stage_bytes_total counter',
+        ]
+        for (name, labels), stage in sorted(stages.items()):
+            label_text = ','.join([f'stage="{name}"'] + [f'{key}="{value}"' for key, value in labels])
+            for bound, count in zip(BUCKETS, stage['buckets']):
+                lines.append(f'pnl_stage_seconds_bucket{{{label_text},le="{bound}"}} {count}')
+            lines.append(f'pnl_stage_seconds_bucket{{{label_text},le="+Inf"}} {stage["count"]}')
+            lines.append(f'pnl_stage_seconds_sum{{{label_text}}} {stage["sum"]}')
+            lines.append(f'pnl_stage_seconds_count{{{label_text}}} {stage["count"]}')
+            counters.append(f'pnl_stage_rows_total{{{label_text}}} {stage["rows"]}')
+            byte_counters.append(f'pnl_stage_bytes_total{{{label_text}}} {stage["bytes"]}')
+        return '\n'.join(lines + counters + byte_counters) + '\n'
+
+
+class Span:
+    """Handle yielded by span(); set rows/nbytes once they are known."""
+
+    def __init__(self):
+        self.rows = None
+        self.nbytes = None
+
+
+@contextmanager
+def span(name, **labels):
+    """Time the enclosed block (sync or across awaits) and record it with its RSS delta.
+
+    A status label tells successful and failed runs apart. RSS is process-wide,
+    so with concurrent reports the delta is indicative only.
+    """
+    handle = Span()
+    rss_before = current_rss_bytes()
+    start = time.perf_counter()
+    status = 'ok'
+    try:
+        yield handle
+    except BaseException:
+        status = 'error'
+        raise
+    finally:
+        get_span_registry().record(
+            name, time.perf_counter() - start, {**labels, 'status': status},
+            rows=handle.rows, nbytes=handle.nbytes, rss_delta=current_rss_bytes() - rss_before,
+        )
+
+
+def record(name, seconds, rows=None, nbytes=None, **labels):
+    """Record a stage whose duration was measured elsewhere, e.g. time spent in one Dune state."""
+    get_span_registry().record(name, seconds, labels, rows=rows, nbytes=nbytes)
+
+
+_span_registry = None
+_span_registry_lock = threading.Lock()
+
+
+def get_span_registry():
+    """Return the process-wide registry; PNL_SPAN_LOG names an optional JSON-lines file of every span."""
+    global _span_registry
+    with _span_registry_lock:
+        if _span_registry is None:
+            _span_registry = SpanRegistry(log_path=os.getenv('PNL_SPAN_LOG') or None)
+        return _span_registry
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split('?')[0] != '/metrics':
+            self.send_error(404)
+            return
+        body = get_span_registry().prometheus_text().encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; version=0.0.4')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_metrics_server(port=None):
+    """Serve /metrics in a daemon thread when a port is given or PNL_METRICS_PORT is set."""
+    port = port or int(os.getenv('PNL_METRICS_PORT', '0'))
+    if not port:
+        return None
+    server = ThreadingHTTPServer(('0.0.0.0', port), _MetricsHandler)
+    threading.Thread(target=server.serve_forever, name='metrics', daemon=True).start()
+    logger.info(f'Serving Prometheus metrics on :{port}/metrics')
+    return server
@@ -0,0 +1,117 @@
+import asyncio
+import logging
+import os
+import socket
+
+logger = logging.getLogger(__name__)
+
+
+class JobRunner:
+    """Runs jobs from the shared StateStore job table in this process, up to `concurrency` at a time.
+
+    Every worker process runs a JobRunner, so a report queued by any of them
+    is picked up by whichever has a free slot. handlers maps a job kind to a
+    coroutine function taking the StoredJob. While a job runs its lease is
+    renewed. If a worker dies, another one claims the job once the lease
+    expires, up to REPORT_JOB_MAX_ATTEMPTS claims. on_failure(job, error) is
+    awaited when a handler raises or a job runs out of attempts.
+    """
+
+    def __init__(self, store, handlers, on_failure=None, concurrency=None, poll_interval=None, lease_seconds=None,
+                 max_attempts=None):
+        self.store = store
+        self.handlers = handlers
+        self.on_failure = on_failure
+        self.worker_id = f'{socket.gethostname()}:{os.getpid()}'
+        self.concurrency = concurrency or int(os.getenv('REPORT_WORKERS', '4'))
+        self.poll_interval = poll_interval or float(os.getenv('REPORT_JOB_POLL_SECONDS', '1'))
+        self.lease_seconds = lease_seconds or float(os.getenv('REPORT_JOB_LEASE_SECONDS', '60'))
+        self.max_attempts = max_attempts or int(os.getenv('REPORT_JOB_MAX_ATTEMPTS', '3'))
+        self._wake = None
+        self._tasks = []
+        self._stopping = False
+
+    def start(self):
+        """Start the claim loops on the running event loop."""
+        if self._tasks:
+            return
+        self._wake = asyncio.Event()
+        self._stopping = False
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.concurrency)]
+        self._tasks.append(asyncio.create_task(self._reaper()))
+        logger.info(f'Job runner {self.worker_id} started with {self.concurrency} slots')
+
+    def wake(self):
+        """Claim right away instead of at the next poll, e.g. after queuing a job in this process."""
+        if self._wake is not None:
+            self._wake.set()
+
+    async def stop(self, timeout=None):
+        """Stop claiming and give running jobs up to timeout seconds (REPORT_DRAIN_SECONDS, default 30) to finish.
+
+        Jobs still running after that are cancelled and handed back to the queue for another worker.
+        """
+        if not self._tasks:
+            return
+        timeout = float(os.getenv('REPORT_DRAIN_SECONDS', '30')) if timeout is None else timeout
+        self._stopping = True
+        self.wake()
+        workers, reaper = self._tasks[:-1], self._tasks[-1]
+        _, unfinished = await asyncio.wait(workers, timeout=timeout)
+        if unfinished:
+            logger.warning(f'Handing {len(unfinished)} unfinished jobs back to the queue')
+        for task in (*unfinished, reaper):
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def _worker(self):
+        while not self._stopping:
+            job = await asyncio.to_thread(self.store.claim_job, self.worker_id, self.lease_seconds, self.max_attempts)
+            if job is None:
+                self._wake.clear()
+                try:
+                    await asyncio.wait_for(self._wake.wait(), self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            await self._run(job)
+
+    async def _run(self, job):
+        logger.info(f'Running job {job.id} ({job.description}) for {job.user}, attempt {job.attempts}')
+        renewer = asyncio.create_task(self._renew(job))
+        try:
+            await self.handlers[job.kind](job)
+        except asyncio.CancelledError:
+            await asyncio.to_thread(self.store.release_job, job.id, self.worker_id)
+            raise
+        except Exception as e:
+            logger.error(f'Job {job.id} ({job.description}) failed: {e}')
+            await asyncio.to_thread(self.store.finish_job, job.id, self.worker_id, 'failed', str(e))
+            await self._notify_failure(job, e)
+        else:
+            await asyncio.to_thread(self.store.finish_job, job.id, self.worker_id, 'done')
+        finally:
+            renewer.cancel()
+
+    async def _renew(self, job):
+        while True:
+            await asyncio.sleep(self.lease_seconds / 3)
+            if not await asyncio.to_thread(self.store.renew_lease, job.id, self.worker_id, self.lease_seconds):
+                logger.warning(f'Lost the lease on job {job.id}; another worker may run it again')
+                return
+
+    async def _reaper(self):
+        while True:
+            for job in await asyncio.to_thread(self.store.reap_jobs, self.max_attempts):
+                logger.error(f'Job {job.id} ({job.description}) failed after {job.attempts} attempts')
+                await self._notify_failure(job, RuntimeError('the worker running it stopped before finishing'))
+            await asyncio.sleep(self.lease_seconds / 2)
+
+    async def _notify_failure(self, job, error):
+        if self.on_failure is None:
+            return
+        try:
+            await self.on_failure(job, error)
+        except Exception as e:
+            logger.error(f'Failure notification for job {job.id} failed: {e}')
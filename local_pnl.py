@@ -0,0 +1,36 @@
+import argparse
+import time
+
+from pnl_aggregates import load_raw_trades
+from pnl_report import CHAIN_SPECS, EXPORT_FORMATS, PnlReportEngine
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Build a PnL report from raw swap rows (Dune export, CSV or Parquet) without querying Dune.')
+    parser.add_argument('chain', choices=sorted(CHAIN_SPECS))
+    parser.add_argument('wallet')
+    parser.add_argument('trades', help='raw dex.trades / dex_solana.trades rows (.csv, .csv.gz or .parquet)')
+    parser.add_argument('--day', default='-30', help='window start relative to today, as in the Dune queries')
+    parser.add_argument('--start', help='window start date YYYY-MM-DD (overrides --day)')
+    parser.add_argument('--end', help='window end date YYYY-MM-DD (inclusive)')
+    parser.add_argument('--output', help='xlsx path, or folder for columnar formats (default: reports)')
+    parser.add_argument('--format', default='xlsx', choices=['xlsx', *EXPORT_FORMATS],
+                        help='columnar formats write <wallet>_summary and <wallet>_transactions files')
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    raw_df = load_raw_trades(args.trades)
+    loaded = time.perf_counter()
+    report = PnlReportEngine(args.chain, args.wallet, day=args.day)
+    report.compute_from_trades(raw_df, start_date=args.start, end_date=args.end)
+    computed = time.perf_counter()
+    if args.format == 'xlsx':
+        report.save_to_excel(args.output)
+    else:
+        report.export_tables(args.format, args.output)
+    print(f"{len(raw_df)} swaps -> {len(report.transaction_df)} tokens "
+          f"(load {loaded - started:.2f}s, compute {computed - loaded:.2f}s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,14 +1,23 @@
+import time
+STARTED = time.perf_counter()  # Reference point for --profile-startup
+
+import argparse
 from dotenv import load_dotenv
 import os
 import logging
 import asyncio
-import re
+from concurrent.futures import ThreadPoolExecutor
 from telegram import InlineKeyboardButton, InlineKeyboardMarkup, Update
 from telegram.constants import ParseMode
 from telegram.ext import Application, CallbackQueryHandler, CommandHandler, ContextTypes, MessageHandler, filters
-from ETH_PNL import WalletReport 
-from BNB_PNL import BNBReport
-from SOLANA_PNL import SOLReport
+from bot_server import application_builder, run_application
+from chain_specs import CHAIN_SPECS
+from instrumentation import span, start_metrics_server
+from job_runner import JobRunner
+from report_stack import close_report_stack, load_report_stack, prewarm_report_stack, profile_startup
+from singleflight import SingleFlight
+from report_scheduler import QueueFullError
+from state_store import get_state_store
 
 # Enable logging
 logging.basicConfig(
@@ -19,20 +28,49 @@ logger = logging.getLogger(__name__)
 # Suppress httpx info logs
 logging.getLogger("httpx").setLevel(logging.WARNING)
 
-# List of allowed usernames
+# Usernames that seed the shared allow-list the first time the state store is created
 ALLOWED_USERS = {'henrytirla'}  # Replace with actual usernames
 
-def is_valid_evm_address(address):
-    """Check if the given string is a valid EVM address."""
-    return bool(re.match(r'^0x[a-fA-F0-9]{40}$', address))
+# Reports a user may have waiting in the shared queue, and threads rendering workbooks in this process
+MAX_QUEUED_PER_USER = int(os.getenv('REPORT_MAX_QUEUED_PER_USER', '5'))
+RENDER_THREADS = int(os.getenv('REPORT_RENDER_THREADS', str(min(int(os.getenv('REPORT_WORKERS', '4')), os.cpu_count() or 1))))
 
 class BotHandler:
     def __init__(self):
         load_dotenv()
         self.token = os.getenv('TELEGRAM_TOKEN')
-        self.application = Application.builder().token(self.token).build()
+        self.report_flights = SingleFlight()
+        self.render_executor = ThreadPoolExecutor(max_workers=RENDER_THREADS, thread_name_prefix='report')
+        self.archive_dir = os.getenv('REPORTS_ARCHIVE_DIR')  # Optional on-disk copy of every report
+        self.metrics_server = start_metrics_server()  # Prometheus /metrics when PNL_METRICS_PORT is set
+        # Chain selections, the allow-list and report jobs are shared by every worker process
+        self.state = get_state_store()
+        self.state.seed_allowed_users(ALLOWED_USERS)
+        self.jobs = JobRunner(self.state, {
+            'report': self.run_report_job,
+            'batch': self.run_batch_job,
+            'cross_chain': self.run_cross_chain_job,
+        }, on_failure=self.job_failed)
+        # pandas, openpyxl and dune_client load on the first report, or in the background once polling starts
+        self.application = (
+            application_builder(self.token).post_init(self.post_init).post_stop(self.post_stop)
+            .post_shutdown(self.post_shutdown).build()
+        )
         self.add_handlers()
 
+    async def post_init(self, application: Application) -> None:
+        prewarm_report_stack()
+        self.jobs.start()
+
+    async def post_stop(self, application: Application) -> None:
+        # Running jobs get REPORT_DRAIN_SECONDS to finish, then go back to the queue for the other workers.
+        # This runs before Application.shutdown closes the bot's HTTP client, so drained jobs can still reply.
+        await self.jobs.stop()
+
+    async def post_shutdown(self, application: Application) -> None:
+        # Every handler and job has finished by now, so nothing uses the Dune connection pools any more
+        await close_report_stack()
+
     def add_handlers(self):
         self.application.add_handler(CommandHandler("start", self.start))
         self.application.add_handler(CallbackQueryHandler(self.button))
@@ -40,10 +78,16 @@ class BotHandler:
         self.application.add_handler(CommandHandler("adduser", self.add_user_command))  # Add handler for adding users
         self.application.add_handler(CommandHandler("listusers", self.list_users_command))  # Handler to list users
         self.application.add_handler(CommandHandler("removeuser", self.remove_user_command))  # Handler to remove users
+        self.application.add_handler(CommandHandler("cachestats", self.cache_stats_command))  # Dune cache and connection counters
+        self.application.add_handler(CommandHandler("credits", self.credits_command))  # Dune credits per user and chain
+        self.application.add_handler(CommandHandler("queue", self.queue_command))  # Handler to list report jobs
+        self.application.add_handler(CommandHandler("cancel", self.cancel_command))  # Handler to cancel queued jobs
+        self.application.add_handler(CommandHandler("batch", self.batch_command))  # Ranked report for many wallets
+        self.application.add_handler(CommandHandler("crosschain", self.cross_chain_command))  # One USD report across chains
         self.application.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, self.handle_wallet_address))
 
     def user_allowed(self, username):
-        return username.lower() in ALLOWED_USERS
+        return self.state.is_allowed(username)
 
     async def start(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
         """Sends a message with two inline buttons attached."""
@@ -59,7 +103,7 @@ class BotHandler:
         #     return
 
         keyboard = [
-            [InlineKeyboardButton("ETH", callback_data='eth_pnl'), InlineKeyboardButton("BNB", callback_data='bnb_pnl'),InlineKeyboardButton("SOL", callback_data='sol_pnl')],
+            [InlineKeyboardButton(spec['native_symbol'], callback_data=f'{chain}_pnl') for chain, spec in CHAIN_SPECS.items()],
         ]
 
         reply_markup = InlineKeyboardMarkup(keyboard)
@@ -75,7 +119,7 @@ class BotHandler:
         #     return
 
         await query.answer()
-        context.user_data['chain'] = query.data
+        self.state.update_session(query.from_user.id, chain=query.data)
 
         await query.edit_message_text(text=f"Selected option: {query.data}. Please enter the wallet address:")
 
@@ -91,40 +135,136 @@ class BotHandler:
         #     return
 
         wallet_address = update.message.text
-        chain = context.user_data.get('chain')
-
-        if not is_valid_evm_address(wallet_address)and chain != 'sol_pnl':
-            await update.message.reply_text("Please enter a valid EVM wallet address.")
-            return
+        chain = self.state.get_session(update.message.from_user.id).get('chain')
 
         if not chain:
             await update.message.reply_text("Please choose a chain first by using /start command.")
             return
 
+        spec = CHAIN_SPECS.get(chain.removesuffix('_pnl'))
+        if spec and not spec['address_validator'](wallet_address):
+            await update.message.reply_text(f"Please enter a valid {spec['name']} wallet address.")
+            return
+
         await update.message.reply_text("Generating report, please wait... You can send another address it will scan subsequently")
 
-        # Run the report generation concurrently
-        asyncio.create_task(self.generate_and_send_report(update, context, chain, wallet_address))
+        job = await self.queue_job(update, 'report', {'chain': chain, 'wallet': wallet_address}, f'{chain} {wallet_address}')
+        if job:
+            await update.message.reply_text(f"Report job {job.id} queued at position {self.state.position(job.id)}.")
+
+    async def queue_job(self, update: Update, kind: str, payload: dict, description: str):
+        """Adds a job to the shared queue, where any worker may run it; returns None if the user's queue is full."""
+        try:
+            job = self.state.enqueue_job(update.message.from_user.id, update.message.chat_id, kind, payload, description,
+                                         max_queued=MAX_QUEUED_PER_USER)
+        except QueueFullError as e:
+            await update.message.reply_text(str(e))
+            return None
+        self.jobs.wake()
+        return job
+
+    async def run_report_job(self, job):
+        """Generates a queued report and sends it to the chat it was requested from."""
+        chain, wallet_address = job.payload['chain'], job.payload['wallet']
+        chain_key = chain.removesuffix('_pnl')
+        if chain_key not in CHAIN_SPECS:
+            raise ValueError("Invalid chain selected.")
+        stack = await load_report_stack()
+        report = stack.pnl_report.PnlReportEngine(chain_key, wallet_address, user=job.user)
+
+        async def build():
+            # Dune is awaited on the event loop; only rendering takes a pool thread
+            await report.fetch_data_async()
+            report_bytes = await self.run_blocking(report.render_report_bytes)
+            self.archive_in_background(report_bytes, chain_key, wallet_address)
+            return report_bytes
+
+        # Jobs running in this worker for the same chain, wallet and window share one Dune execution and workbook
+        report_bytes = await self.report_flights.do((chain, wallet_address, report.day), build)
 
-    async def generate_and_send_report(self, update: Update, context: ContextTypes.DEFAULT_TYPE, chain: str, wallet_address: str):
-        """Generates the report and sends it to the user."""
-        if chain == 'eth_pnl':
-            report = WalletReport(wallet_address)
-        elif chain == 'bnb_pnl':
-            report = BNBReport(wallet_address)
-        elif chain == 'sol_pnl':
-            report = SOLReport(wallet_address)
-        else:
-            await update.message.reply_text("Invalid chain selected.")
+        # Send the generated report back to the user
+        with span('telegram_upload', chain=chain_key) as stage:
+            stage.nbytes = len(report_bytes)
+            await self.application.bot.send_document(job.chat_id, document=report_bytes, filename=f"{wallet_address}.xlsx")
+
+    @staticmethod
+    def describe_job(job):
+        return {
+            'report': f"report for {job.payload.get('wallet')}",
+            'batch': "batch report",
+            'cross_chain': "cross-chain report",
+        }[job.kind]
+
+    async def job_failed(self, job, error):
+        await self.application.bot.send_message(job.chat_id, f"Failed to generate {self.describe_job(job)}: {error}")
+
+    async def batch_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+        """Builds one ranked workbook for many wallets: /batch <chain> <wallet> <wallet> ..."""
+        chains = ', '.join(CHAIN_SPECS)
+        if len(context.args) < 2 or context.args[0].lower() not in CHAIN_SPECS:
+            await update.message.reply_text(f"Usage: /batch <{chains}> <wallet> <wallet> ... (spaces, commas or new lines)")
             return
 
-        await asyncio.to_thread(report.generate_report)
+        chain = context.args[0].lower()
+        wallets = [wallet for arg in context.args[1:] for wallet in arg.split(',')]
+        stack = await load_report_stack()
+        try:
+            batch = stack.batch_report.BatchReport(chain, wallets)
+        except ValueError as e:
+            await update.message.reply_text(str(e))
+            return
 
-        output_file_path = os.path.join("reports", f"{wallet_address}.xlsx")
+        job = await self.queue_job(update, 'batch', {'chain': chain, 'wallets': batch.wallets},
+                                   f'{chain} batch of {len(batch.wallets)} wallets')
+        if job:
+            await update.message.reply_text(
+                f"Batch job {job.id} for {len(batch.wallets)} wallets queued at position {self.state.position(job.id)}."
+            )
+
+    async def run_batch_job(self, job):
+        chain, wallets = job.payload['chain'], job.payload['wallets']
+        stack = await load_report_stack()
+        batch = stack.batch_report.BatchReport(chain, wallets, user=job.user)
+        await batch.fetch_data_async()
+        report_bytes = await self.run_blocking(batch.render_report_bytes)
+        self.archive_in_background(report_bytes, chain, f'batch_{len(batch.wallets)}')
+        await self.application.bot.send_document(
+            job.chat_id, document=report_bytes, filename=f"{chain}_batch_{len(batch.wallets)}_wallets.xlsx"
+        )
+
+    async def cross_chain_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+        """Builds one USD-normalized workbook across chains: /crosschain eth:<wallet> sol:<wallet> ..."""
+        stack = await load_report_stack()
+        try:
+            pairs = stack.cross_chain_report.parse_chain_wallets(context.args)
+        except ValueError as e:
+            await update.message.reply_text(f"{e}\nUsage: /crosschain eth:<wallet> bnb:<wallet> sol:<wallet>")
+            return
 
-        # Send the generated report back to the user
-        with open(output_file_path, 'rb') as file:
-            await update.message.reply_document(document=file, filename=f"{wallet_address}.xlsx")
+        job = await self.queue_job(update, 'cross_chain', {'pairs': pairs}, f'cross-chain {len(pairs)} wallets')
+        if job:
+            await update.message.reply_text(f"Cross-chain job {job.id} queued at position {self.state.position(job.id)}.")
+
+    async def run_cross_chain_job(self, job):
+        stack = await load_report_stack()
+        report = stack.cross_chain_report.CrossChainReport(job.payload['pairs'], user=job.user)
+        # All chains are fetched concurrently, so this waits about as long as the slowest one
+        await report.fetch_data_async()
+        report_bytes = await self.run_blocking(report.render_report_bytes)
+        wallet_address = report.reports[0].wallet_address
+        self.archive_in_background(report_bytes, 'cross_chain', wallet_address)
+        await self.application.bot.send_document(job.chat_id, document=report_bytes, filename=f"cross_chain_{wallet_address}.xlsx")
+
+    async def run_blocking(self, func):
+        """Run a blocking render on the bounded render pool instead of the default executor."""
+        return await asyncio.get_running_loop().run_in_executor(self.render_executor, func)
+
+    def archive_in_background(self, report_bytes, chain, wallet_address):
+        """Write a copy of the report to REPORTS_ARCHIVE_DIR without delaying the reply."""
+        if self.archive_dir:
+            from pnl_report import archive_report  # Already loaded by the report being archived
+            # Tracked by the application, so shutdown waits for the write
+            self.application.create_task(asyncio.to_thread(archive_report, report_bytes, chain, wallet_address, self.archive_dir))
 
     async def help_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
         """Displays info on how to use the bot."""
@@ -144,7 +284,7 @@ class BotHandler:
 
         try:
             new_username = context.args[0]
-            ALLOWED_USERS.add(new_username)
+            self.state.add_allowed_user(new_username, added_by=username)
             await update.message.reply_text(f"User {new_username} added to the allowed users list.")
             logger.info(f'User {new_username} added by {username}')
         except IndexError:
@@ -157,7 +297,7 @@ class BotHandler:
             await update.message.reply_text("You are not authorized to use this bot.")
             return
 
-        users_list = "\n".join(ALLOWED_USERS)
+        users_list = "\n".join(self.state.allowed_users())
         await update.message.reply_text(f"Allowed users:\n{users_list}")
 
     async def remove_user_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
@@ -169,8 +309,7 @@ class BotHandler:
 
         try:
             remove_username = context.args[0]
-            if remove_username in ALLOWED_USERS:
-                ALLOWED_USERS.remove(remove_username)
+            if self.state.remove_allowed_user(remove_username):
                 await update.message.reply_text(f"User {remove_username} removed from the allowed users list.")
                 logger.info(f'User {remove_username} removed by {username}')
             else:
@@ -178,10 +317,94 @@ class BotHandler:
         except IndexError:
             await update.message.reply_text("Please provide a valid username.")
 
+    async def cache_stats_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+        """Shows the Dune result cache and connection pool counters."""
+        username = update.message.from_user.username
+        if username != "henrytirla":
+            await update.message.reply_text("You are not authorized to view cache stats.")
+            return
+
+        stack = await load_report_stack()
+        stats = {**stack.dune_cache.get_query_cache().stats(), **stack.dune_clients.connection_stats()}
+        await update.message.reply_text("\n".join(f"{name}: {value}" for name, value in stats.items()))
+
+    async def credits_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+        """Shows the Dune credits spent per user and chain: /credits [days], default today (UTC)."""
+        username = update.message.from_user.username
+        if username != "henrytirla":
+            await update.message.reply_text("You are not authorized to view Dune credits.")
+            return
+
+        try:
+            days = max(1, int(context.args[0])) if context.args else 1
+        except ValueError:
+            await update.message.reply_text("Usage: /credits [days]")
+            return
+
+        since_day = time.strftime('%Y-%m-%d', time.gmtime(time.time() - (days - 1) * 86400))
+        usage = self.state.dune_credit_usage(since_day)
+        if not usage:
+            await update.message.reply_text(f"No Dune executions since {since_day}.")
+            return
+
+        total = sum(credits for *_, credits in usage)
+        lines = [f"{user} {chain} ({performance}): {executions} runs, {credits:g} credits"
+                 for user, chain, performance, executions, credits in usage]
+        await update.message.reply_text(f"Dune credits since {since_day}: {total:g}\n" + "\n".join(lines))
+
+    async def queue_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+        """Lists queued and running report jobs."""
+        username = update.message.from_user.username
+        if username != "henrytirla":
+            await update.message.reply_text("You are not authorized to view the job queue.")
+            return
+
+        jobs = self.state.active_jobs()
+        if not jobs:
+            await update.message.reply_text("No report jobs queued.")
+            return
+
+        lines = []
+        for job in jobs:
+            position = self.state.position(job.id)
+            status = f"position {position}" if position else f"{job.state} on {job.worker}"
+            lines.append(f"{job.id}: {job.description} (user {job.user}, {status})")
+        await update.message.reply_text("Report jobs:\n" + "\n".join(lines))
+
+    async def cancel_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+        """Cancels a queued report job."""
+        username = update.message.from_user.username
+        if username != "henrytirla":
+            await update.message.reply_text("You are not authorized to cancel jobs.")
+            return
+
+        try:
+            job_id = int(context.args[0])
+        except (IndexError, ValueError):
+            await update.message.reply_text("Please provide a valid job id.")
+            return
+
+        job = self.state.cancel_job(job_id)
+        if job is None:
+            await update.message.reply_text(f"Report job {job_id} is not queued.")
+            return
+
+        await update.message.reply_text(f"Report job {job_id} cancelled.")
+        logger.info(f'Report job {job_id} cancelled by {username}')
+        if job.chat_id is not None and job.chat_id != update.effective_chat.id:
+            await self.application.bot.send_message(job.chat_id, f"Your {self.describe_job(job)} was cancelled.")
+
     def run(self):
-        """Run the bot."""
-        self.application.run_polling(allowed_updates=Update.ALL_TYPES)
+        """Run the bot by polling, or as a webhook server when TELEGRAM_WEBHOOK_URL is set."""
+        run_application(self.application, allowed_updates=Update.ALL_TYPES)
 
 if __name__ == "__main__":
-    bot_handler = BotHandler()
-    bot_handler.run()
+    parser = argparse.ArgumentParser(description="DEX PnL Telegram bot")
+    parser.add_argument('--profile-startup', action='store_true',
+                        help='print import and startup timings, then exit without polling')
+    args = parser.parse_args()
+    if args.profile_startup:
+        profile_startup(STARTED, BotHandler)
+    else:
+        bot_handler = BotHandler()
+        bot_handler.run()
@@ -1,8 +1,12 @@
+import time
+STARTED = time.perf_counter()  # Reference point for --profile-startup
+
+import argparse
 import logging
 import os
-import re
 from dotenv import load_dotenv
 import asyncio
+import math
 import sys
 
 # Try to import telegram modules with error handling
@@ -15,16 +19,22 @@ except ImportError as e:
     print("Please run: pip install python-telegram-bot==20.8")
     sys.exit(1)
 
-# Import your report modules
+# Import your report modules; pandas, openpyxl and dune_client load on the first report
+# (see report_stack) so the bot answers /start without waiting for them
 try:
-    from ETH_PNL import WalletReport 
-    from BNB_PNL import BNBReport
-    from SOLANA_PNL import SOLReport
+    from chain_specs import CHAIN_SPECS
+    from report_stack import close_report_stack, load_report_stack, prewarm_report_stack, profile_startup
 except ImportError as e:
     print(f"Error importing report modules: {e}")
     print("Make sure all PNL modules are in the same directory")
     sys.exit(1)
 
+from singleflight import DetachedError, SingleFlight
+from report_scheduler import ReportScheduler
+from bot_server import application_builder, run_application
+from instrumentation import span, start_metrics_server
+from state_store import get_state_store
+
 # Set up logging
 logging.basicConfig(
     format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
@@ -36,13 +46,112 @@ logger = logging.getLogger(__name__)
 logging.getLogger("httpx").setLevel(logging.WARNING)
 logging.getLogger("httpcore").setLevel(logging.WARNING)
 
-def is_valid_evm_address(address):
-    """Check if the given string is a valid EVM address."""
-    return bool(re.match(r'^0x[a-fA-F0-9]{40}$', address))
+def format_summary(summary_df, spec):
+    """Headline metrics of a summary_df as Telegram markdown lines"""
+    row = summary_df.iloc[0]
+    symbol = spec['native_symbol']
+
+    def number(value, suffix=''):
+        value = float(value)
+        return 'n/a' if math.isnan(value) or math.isinf(value) else f"{value:,.4f}{suffix}"
+
+    return (
+        f"Tokens traded: {row['number_of_tokens_traded']}\n"
+        f"Total spent: {number(row['total_spent_amount'], ' ' + symbol)}\n"
+        f"Actual profit: {number(row['actual_profit'], ' ' + symbol)}\n"
+        f"Realized gains: {number(row['pnl_r'], ' ' + symbol)}\n"
+        f"Realized losses: {number(row['pnl_l'], ' ' + symbol)}\n"
+        f"Win rate: {number(row['win_rate'], '%')}\n"
+        f"Loss rate: {number(row['loss_rate'], '%')}"
+    )
+
+
+class ReportProgress:
+    """Shows a report's pipeline stages in its processing message and posts the summary early
+
+    Called as on_progress(stage, detail) by PnlReportEngine.fetch_data_async, once for every
+    request waiting on the report. Telegram limits message edits, so updates are coalesced
+    to at most one edit per min_interval.
+    """
+
+    def __init__(self, update, processing_msg, chain, wallet_address, min_interval=2.0):
+        self.update = update
+        self.processing_msg = processing_msg
+        self.spec = CHAIN_SPECS[chain]
+        self.wallet_address = wallet_address
+        self.min_interval = min_interval
+        self.status = "Queued"
+        self.summary_df = None
+        self.started = time.monotonic()
+        self._shown = None
+        self._last_edit = 0.0
+        self._task = None
+
+    def __call__(self, stage, detail):
+        if stage == 'queued':
+            self.status = f"Queued at position {detail}, send /cancel to cancel it"
+        elif stage == 'query':
+            self.status = f"Querying Dune for {detail}"
+        elif stage == 'state':
+            self.status = f"Dune execution {detail.removeprefix('QUERY_STATE_').lower()}"
+        elif stage == 'rows':
+            self.status = f"Received {detail} rows, computing summary"
+        elif stage == 'summary':
+            self.status = "Summary ready, rendering workbook"
+            self.summary_df = detail
+            asyncio.create_task(self.send_summary(detail))
+        elif stage == 'rendered':
+            self.status = f"Workbook rendered ({detail / 1024:,.0f} KB), uploading"
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._flush())
+
+    def catch_up(self, other):
+        """Show what other, a request already waiting on the same report, has shown so far"""
+        if other.summary_df is not None:
+            self.summary_df = other.summary_df
+            asyncio.create_task(self.send_summary(other.summary_df))
+        self.status = other.status
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._flush())
+
+    def text(self):
+        return (
+            f"⏳ **Generating {self.spec['name']} PNL Report**\n\n"
+            f"Wallet: `{self.wallet_address}`\n"
+            f"Status: {self.status} ({time.monotonic() - self.started:.0f}s)"
+        )
+
+    async def _flush(self):
+        # Keep editing until the message shows the latest status
+        while self._shown != self.status:
+            wait = self.min_interval - (time.monotonic() - self._last_edit)
+            if wait > 0:
+                await asyncio.sleep(wait)
+            status = self.status
+            self._last_edit = time.monotonic()
+            try:
+                await self.processing_msg.edit_text(self.text(), parse_mode=ParseMode.MARKDOWN)
+            except Exception as e:
+                logger.debug(f"Progress edit skipped: {e}")
+            self._shown = status
+
+    async def send_summary(self, summary_df):
+        try:
+            await self.update.message.reply_text(
+                f"{self.spec['emoji']} **{self.spec['name']} PNL Summary**\n\n"
+                f"Wallet: `{self.wallet_address}`\n"
+                f"{format_summary(summary_df, self.spec)}\n\n"
+                f"The full workbook follows shortly.",
+                parse_mode=ParseMode.MARKDOWN
+            )
+        except Exception as e:
+            logger.error(f"Error sending summary: {e}")
+
+    def close(self):
+        """Stop pending edits before the processing message is deleted"""
+        if self._task is not None:
+            self._task.cancel()
 
-def is_valid_solana_address(address):
-    """Basic check for Solana address format."""
-    return 32 <= len(address) <= 44 and address.isalnum()
 
 class DEXPNLBot:
     def __init__(self):
@@ -52,17 +161,24 @@ class DEXPNLBot:
         if not self.token:
             raise ValueError("TELEGRAM_TOKEN not found in .env file")
         
-        # Initialize application
-        self.application = None
-        self.user_data = {}  # Simple in-memory storage for user states
+        self.state = get_state_store()  # User states (chain, format), shared by every worker process
+        self.report_flights = SingleFlight()  # De-duplicates concurrent reports for the same wallet
+        self.waiting_reports = {}  # ReportProgress -> flight key, for every request waiting on a report
+        self.flight_jobs = {}  # Flight key -> the scheduler job generating it
+        self.scheduler = ReportScheduler()  # Bounded, per-user fair pool for report jobs
+        self.archive_dir = os.getenv('REPORTS_ARCHIVE_DIR')  # Optional on-disk copy of every report
+        self.metrics_server = start_metrics_server()  # Prometheus /metrics when PNL_METRICS_PORT is set
+
+        # Create application; the report stack is pre-warmed in the background once polling starts
+        self.application = application_builder(self.token).post_init(self.prewarm).post_shutdown(self.post_shutdown).build()
+        self.add_handlers()
         
     async def start_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Handle /start command"""
         keyboard = [
             [
-                InlineKeyboardButton("🔵 Ethereum", callback_data='eth'),
-                InlineKeyboardButton("🟡 Binance", callback_data='bnb'),
-                InlineKeyboardButton("🟣 Solana", callback_data='sol')
+                InlineKeyboardButton(f"{spec['emoji']} {spec['name']}", callback_data=chain)
+                for chain, spec in CHAIN_SPECS.items()
             ]
         ]
         reply_markup = InlineKeyboardMarkup(keyboard)
@@ -92,16 +208,11 @@ class DEXPNLBot:
         user_id = query.from_user.id
         chain = query.data
         
-        # Store user's chain selection
-        self.user_data[user_id] = {'chain': chain}
+        # Store user's chain selection, keeping other preferences such as the report format
+        self.state.update_session(user_id, chain=chain)
         
-        chain_names = {
-            'eth': '🔵 Ethereum',
-            'bnb': '🟡 Binance Smart Chain',
-            'sol': '🟣 Solana'
-        }
-        
-        chain_name = chain_names.get(chain, chain.upper())
+        spec = CHAIN_SPECS.get(chain)
+        chain_name = f"{spec['emoji']} {spec['name']}" if spec else chain.upper()
         
         await query.edit_message_text(
             text=f"✅ **Selected: {chain_name}**\n\n"
@@ -115,13 +226,14 @@ class DEXPNLBot:
         wallet_address = update.message.text.strip()
         
         # Check if user has selected a chain
-        if user_id not in self.user_data:
+        session = self.state.get_session(user_id)
+        if not session:
             await update.message.reply_text(
                 "⚠️ Please start by selecting a blockchain using /start"
             )
             return
         
-        chain = self.user_data[user_id].get('chain')
+        chain = session.get('chain')
         if not chain:
             await update.message.reply_text(
                 "⚠️ Please select a blockchain first using /start"
@@ -129,28 +241,16 @@ class DEXPNLBot:
             return
         
         # Validate wallet address
-        if chain in ['eth', 'bnb']:
-            if not is_valid_evm_address(wallet_address):
-                await update.message.reply_text(
-                    "❌ Invalid EVM address format.\n"
-                    "Please provide a valid address (e.g., 0x1234...)"
-                )
-                return
-        elif chain == 'sol':
-            if not is_valid_solana_address(wallet_address):
-                await update.message.reply_text(
-                    "❌ Invalid Solana address format.\n"
-                    "Please provide a valid Solana address."
-                )
-                return
+        spec = CHAIN_SPECS.get(chain)
+        if spec and not spec['address_validator'](wallet_address):
+            await update.message.reply_text(
+                f"❌ Invalid {spec['name']} address format.\n"
+                f"Please provide a valid {spec['name']} wallet address."
+            )
+            return
         
         # Send processing message
-        chain_names = {
-            'eth': 'Ethereum',
-            'bnb': 'Binance Smart Chain', 
-            'sol': 'Solana'
-        }
-        chain_name = chain_names.get(chain, chain.upper())
+        chain_name = spec['name'] if spec else chain.upper()
         
         processing_msg = await update.message.reply_text(
             f"⏳ **Generating {chain_name} PNL Report**\n\n"
@@ -161,7 +261,8 @@ class DEXPNLBot:
         
         # Generate report asynchronously
         try:
-            await self.generate_report(update, wallet_address, chain, processing_msg)
+            report_format = session.get('format', 'xlsx')
+            await self.generate_report(update, wallet_address, chain, processing_msg, report_format)
         except Exception as e:
             logger.error(f"Error generating report: {e}")
             await processing_msg.edit_text(
@@ -171,51 +272,85 @@ class DEXPNLBot:
                 parse_mode=ParseMode.MARKDOWN
             )
 
-    async def generate_report(self, update: Update, wallet_address: str, chain: str, processing_msg):
+    async def generate_report(self, update: Update, wallet_address: str, chain: str, processing_msg, report_format: str = 'xlsx'):
         """Generate and send PNL report"""
+        progress = None
         try:
-            # Select appropriate report class
-            if chain == 'eth':
-                report_class = WalletReport
-            elif chain == 'bnb':
-                report_class = BNBReport
-            elif chain == 'sol':
-                report_class = SOLReport
-            else:
+            if chain not in CHAIN_SPECS:
                 raise ValueError(f"Unsupported chain: {chain}")
             
             # Create report instance
-            report = report_class(wallet_address)
-            
-            # Generate report (run in thread to avoid blocking)
-            await asyncio.get_event_loop().run_in_executor(
-                None, report.generate_report
-            )
+            stack = await load_report_stack()
+            report = stack.pnl_report.PnlReportEngine(chain, wallet_address, user=update.message.from_user.id)
+            progress = ReportProgress(update, processing_msg, chain, wallet_address)
             
-            # Check if report file exists
-            report_file = os.path.join("reports", f"{wallet_address}.xlsx")
-            if not os.path.exists(report_file):
-                raise FileNotFoundError("Report file was not generated")
+            chain_name = CHAIN_SPECS[chain]['name']
             
-            # Send the report file
-            chain_names = {
-                'eth': 'Ethereum',
-                'bnb': 'Binance_Smart_Chain',
-                'sol': 'Solana'
-            }
-            chain_name = chain_names.get(chain, chain.upper())
+            # Generate report without blocking the event loop; concurrent requests
+            # for the same chain, wallet, window and format share one execution
+            key = (chain, wallet_address, report.day, report_format)
+
+            def broadcast(stage, detail):
+                # Every request waiting on the report gets its progress and early summary
+                for waiter in self.report_flights.waiters(key):
+                    waiter(stage, detail)
+
+            def render():
+                if report_format == 'xlsx':
+                    return {f"{chain_name.replace(' ', '_')}_PNL_{wallet_address[:8]}.xlsx": report.render_report_bytes()}
+                return report.render_export_bytes(report_format)
+
+            async def build():
+                # Dune is awaited on the event loop; only rendering takes a pool thread.
+                # The summary is posted as soon as it exists, the files follow.
+                await report.fetch_data_async(on_progress=broadcast)
+                files = await self.scheduler.run_blocking(render)
+                broadcast('rendered', sum(len(data) for data in files.values()))
+                return files
+
+            async def run_report():
+                job = self.scheduler.submit(update.message.from_user.id, build, f"{chain} {wallet_address}")
+                self.flight_jobs[key] = job
+                try:
+                    position = self.scheduler.position(job.id)
+                    if position > 1:
+                        broadcast('queued', position)
+                    files = await job.future
+                except asyncio.CancelledError:
+                    # Every request waiting on the report was cancelled
+                    self.scheduler.cancel(job.id)
+                    raise
+                finally:
+                    if self.flight_jobs.get(key) is job:
+                        del self.flight_jobs[key]
+                if report_format == 'xlsx':
+                    self.archive_in_background(next(iter(files.values())), chain, wallet_address)
+                return files
+
+            waiting = self.report_flights.waiters(key)
+            if waiting:
+                progress.catch_up(waiting[0])
+            self.waiting_reports[progress] = key
+            try:
+                files = await self.report_flights.do(key, run_report, waiter=progress)
+            finally:
+                del self.waiting_reports[progress]
             
-            with open(report_file, 'rb') as file:
-                await update.message.reply_document(
-                    document=file,
-                    filename=f"{chain_name}_PNL_{wallet_address[:8]}.xlsx",
-                    caption=f"📊 **{chain_name} PNL Report**\n\n"
-                           f"Wallet: `{wallet_address}`\n"
-                           f"Period: Last 30 days",
-                    parse_mode=ParseMode.MARKDOWN
-                )
+            # Send the report files
+            with span('telegram_upload', chain=chain) as stage:
+                stage.nbytes = sum(len(data) for data in files.values())
+                for filename, data in files.items():
+                    await update.message.reply_document(
+                        document=data,
+                        filename=filename,
+                        caption=f"📊 **{chain_name} PNL Report**\n\n"
+                               f"Wallet: `{wallet_address}`\n"
+                               f"Period: Last 30 days",
+                        parse_mode=ParseMode.MARKDOWN
+                    )
             
             # Delete processing message
+            progress.close()
             try:
                 await processing_msg.delete()
             except:
@@ -223,8 +358,17 @@ class DEXPNLBot:
             
             logger.info(f"Report sent successfully for {wallet_address} on {chain}")
             
+        except DetachedError:
+            progress.close()
+            await processing_msg.edit_text(
+                f"🚫 **Report cancelled**\n\nWallet: `{wallet_address}`",
+                parse_mode=ParseMode.MARKDOWN
+            )
+
         except Exception as e:
             logger.error(f"Error in generate_report: {e}")
+            if progress is not None:
+                progress.close()
             await processing_msg.edit_text(
                 f"❌ **Failed to generate report**\n\n"
                 f"Wallet: `{wallet_address}`\n"
@@ -233,17 +377,74 @@ class DEXPNLBot:
                 parse_mode=ParseMode.MARKDOWN
             )
 
+    def archive_in_background(self, report_bytes, chain, wallet_address):
+        """Write a copy of the report to REPORTS_ARCHIVE_DIR without delaying the reply"""
+        if self.archive_dir:
+            from pnl_report import archive_report  # Already loaded by the report being archived
+            # Tracked by the application, so shutdown waits for the write
+            self.application.create_task(asyncio.to_thread(archive_report, report_bytes, chain, wallet_address, self.archive_dir))
+
+    async def format_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Handle /format command: choose between the Excel workbook and columnar exports"""
+        user_id = update.message.from_user.id
+        stack = await load_report_stack()
+        formats = ['xlsx', *stack.pnl_report.EXPORT_FORMATS]
+        if not context.args or context.args[0].lower() not in formats:
+            current = self.state.get_session(user_id).get('format', 'xlsx')
+            await update.message.reply_text(
+                f"Current report format: `{current}`\n"
+                f"Usage: /format <{'|'.join(formats)}>\n\n"
+                f"parquet, arrow and csv.gz send the summary and transactions as two typed files "
+                f"that load straight into pandas.",
+                parse_mode=ParseMode.MARKDOWN
+            )
+            return
+
+        self.state.update_session(user_id, format=context.args[0].lower())
+        await update.message.reply_text(f"✅ Reports will be sent as `{context.args[0].lower()}`.", parse_mode=ParseMode.MARKDOWN)
+
+    async def cancel_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Handle /cancel [job id]: cancel the user's queued reports, or only the given one
+
+        A report other users are also waiting for keeps running for them; only the
+        user who cancels stops waiting.
+        """
+        user_id = update.message.from_user.id
+        requests = [(progress, key) for progress, key in self.waiting_reports.items()
+                    if progress.update.message.from_user.id == user_id]
+        if context.args:
+            try:
+                job_id = int(context.args[0])
+            except ValueError:
+                await update.message.reply_text("Usage: /cancel [job id]")
+                return
+            requests = [(progress, key) for progress, key in requests
+                        if key in self.flight_jobs and self.flight_jobs[key].id == job_id]
+
+        cancelled = []
+        for progress, key in requests:
+            job = self.flight_jobs.get(key)
+            if (job is None or job.state == 'queued') and self.report_flights.detach(key, progress):
+                cancelled.append(progress.wallet_address)
+        if cancelled:
+            await update.message.reply_text(f"🚫 Cancelled your queued report(s) for {', '.join(cancelled)}.")
+        else:
+            await update.message.reply_text(
+                "You have no queued reports to cancel. Reports that are already running cannot be cancelled."
+            )
+
     async def help_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Handle /help command"""
         help_text = (
             "🤖 **DEX PNL Bot Help**\n\n"
             "**Commands:**\n"
             "• /start - Start the bot and select blockchain\n"
-            "• /help - Show this help message\n\n"
+            "• /help - Show this help message\n"
+            "• /format - Choose xlsx, parquet, arrow or csv.gz output\n"
+            "• /cancel - Cancel your queued reports\n\n"
             "**Supported Chains:**\n"
-            "• 🔵 Ethereum\n"
-            "• 🟡 Binance Smart Chain\n"
-            "• 🟣 Solana\n\n"
+            + "".join(f"• {spec['emoji']} {spec['name']}\n" for spec in CHAIN_SPECS.values())
+            + "\n"
             "**How to use:**\n"
             "1. Send /start\n"
             "2. Select your blockchain\n"
@@ -253,31 +454,45 @@ class DEXPNLBot:
         )
         await update.message.reply_text(help_text, parse_mode=ParseMode.MARKDOWN)
 
+    async def prewarm(self, application: Application):
+        prewarm_report_stack()
+
+    async def post_shutdown(self, application: Application):
+        # Running handlers have finished, so the Dune connection pools can be closed
+        await close_report_stack()
+
     async def error_handler(self, update: object, context: ContextTypes.DEFAULT_TYPE):
         """Handle errors"""
         logger.error("Exception while handling update:", exc_info=context.error)
 
-    def run(self):
-        """Run the bot"""
-        # Create application
-        self.application = Application.builder().token(self.token).build()
-        
-        # Add handlers
+    def add_handlers(self):
         self.application.add_handler(CommandHandler("start", self.start_command))
         self.application.add_handler(CommandHandler("help", self.help_command))
+        self.application.add_handler(CommandHandler("format", self.format_command))
+        self.application.add_handler(CommandHandler("cancel", self.cancel_command))
         self.application.add_handler(CallbackQueryHandler(self.button_callback))
         self.application.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, self.handle_message))
         self.application.add_error_handler(self.error_handler)
-        
+
+    def run(self):
+        """Run the bot"""
         print("🤖 DEX PNL Bot starting...")
         print("✅ Bot is ready!")
         print("📱 Send /start to your bot to begin")
         
-        # Start polling
-        self.application.run_polling(drop_pending_updates=True)
+        # Poll, or serve a webhook when TELEGRAM_WEBHOOK_URL is set; updates are handled concurrently
+        run_application(self.application, drop_pending_updates=True)
 
 def main():
     """Main function"""
+    parser = argparse.ArgumentParser(description="DEX PNL Telegram bot")
+    parser.add_argument('--profile-startup', action='store_true',
+                        help='print import and startup timings, then exit without polling')
+    args = parser.parse_args()
+    if args.profile_startup:
+        profile_startup(STARTED, DEXPNLBot)
+        return
+
     try:
         bot = DEXPNLBot()
         bot.run()
@@ -0,0 +1,196 @@
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+import pandas as pd
+
+# Grain of DuneQueries/<Chain>/daily_aggregates.sql: one row per token, maker and day
+BUCKET_KEY = ['token_symbol', 'token_address', 'maker', 'block_date']
+SUM_COLUMNS = ['incoming', 'outcome', 'spent_amount', 'earned_amount', 'spent_usd', 'earned_usd', 'number_buys', 'number_sells']
+AGGREGATE_COLUMNS = BUCKET_KEY + SUM_COLUMNS + ['first_block_time', 'last_block_time']
+TIMESTAMP_FORMAT = '%Y-%m-%d %H:%M:%S.%f'
+
+
+def parse_timestamps(values):
+    """Parse Dune timestamps ('2024-05-01 12:34:56.000 UTC') to naive UTC datetimes."""
+    return pd.to_datetime(pd.Series(values, dtype=str).str.replace(' UTC', '', regex=False), format='ISO8601')
+
+
+def format_timestamps(values):
+    """Normalize Dune timestamps to sortable millisecond strings."""
+    return parse_timestamps(values).dt.strftime(TIMESTAMP_FORMAT).str[:-3]
+
+
+def normalize_aggregates(df):
+    """Bring a daily aggregates frame to AGGREGATE_COLUMNS with normalized types."""
+    df = df.copy()
+    df.columns = [col.lower() for col in df.columns]
+    if df.empty:
+        return pd.DataFrame(columns=AGGREGATE_COLUMNS)
+    df['block_date'] = pd.to_datetime(df['block_date'].astype(str).str[:10]).dt.strftime('%Y-%m-%d')
+    df['first_block_time'] = format_timestamps(df['first_block_time']).to_numpy()
+    df['last_block_time'] = format_timestamps(df['last_block_time']).to_numpy()
+    df[SUM_COLUMNS] = df[SUM_COLUMNS].fillna(0)
+    return df[AGGREGATE_COLUMNS]
+
+
+# Symbols transaction.sql drops on either side of a swap
+EXCLUDED_SYMBOLS = ['wstETH', 'UST', 'DAI', 'WBTC', 'ADA', 'BTCB', 'BUSD', 'USDT', 'USDC', 'Cake', 'MATIC', 'BSC-USD', 'ETH']
+
+
+def load_raw_trades(path):
+    """Read raw dex.trades / dex_solana.trades rows from a Dune CSV export (optionally gzipped) or Parquet file."""
+    if path.endswith('.parquet'):
+        return pd.read_parquet(path)
+    return pd.read_csv(path)
+
+
+def aggregate_raw_trades(raw_df, spec, wallet_address=None):
+    """Aggregate raw swap rows into daily buckets, mirroring the filters and sums of transaction.sql.
+
+    Rows for other wallets are dropped when wallet_address is given. The result
+    has AGGREGATE_COLUMNS and can be stored, merged or rolled up with
+    build_transaction_df, so any window can be recomputed without going back to Dune.
+    """
+    raw = raw_df.copy()
+    raw.columns = [col.lower() for col in raw.columns]
+    quote = spec['quote_symbol']
+    maker = raw[spec['maker_column']].astype(str)
+    if wallet_address is not None:
+        if spec['address_case_sensitive']:
+            raw = raw[maker == wallet_address]
+        else:
+            raw = raw[maker.str.lower() == wallet_address.lower()]
+
+    sold = raw['token_sold_symbol']
+    bought = raw['token_bought_symbol']
+    # NOT x IN (...) is NULL for a NULL symbol in SQL, which drops the row
+    keep = (
+        ((bought == quote) | (sold == quote))
+        & sold.notna() & bought.notna()
+        & ~sold.isin(EXCLUDED_SYMBOLS) & ~bought.isin(EXCLUDED_SYMBOLS)
+    )
+    raw = raw[keep]
+    if raw.empty:
+        return pd.DataFrame(columns=AGGREGATE_COLUMNS)
+
+    is_sell = (raw['token_bought_symbol'] == quote).to_numpy()
+    is_buy = ~is_sell
+    bought_amount = raw['token_bought_amount'].fillna(0).to_numpy(dtype=float)
+    sold_amount = raw['token_sold_amount'].fillna(0).to_numpy(dtype=float)
+    amount_usd = raw['amount_usd'].fillna(0).to_numpy(dtype=float)
+    if spec['token_address_source'] == 'mint':
+        token_address = np.where(is_sell, raw['token_sold_mint_address'], raw['token_bought_mint_address'])
+    else:
+        token_address = raw[spec['token_address_source']].to_numpy()
+    # min/max on datetime64 stays in the cython groupby path; strings would fall back to Python
+    block_time = parse_timestamps(raw['block_time']).to_numpy()
+
+    trades = pd.DataFrame({
+        'token_symbol': np.where(raw['token_sold_symbol'] != quote, raw['token_sold_symbol'], raw['token_bought_symbol']),
+        'token_address': token_address,
+        'maker': raw[spec['maker_column']].to_numpy(),
+        'block_date': pd.Series(block_time).dt.strftime('%Y-%m-%d').to_numpy(),
+        'incoming': np.where(is_buy, bought_amount, 0),
+        'outcome': np.where(is_sell, sold_amount, 0),
+        'spent_amount': np.where(is_buy, sold_amount, 0),
+        'earned_amount': np.where(is_sell, bought_amount, 0),
+        'spent_usd': np.where(is_buy, amount_usd, 0),
+        'earned_usd': np.where(is_sell, amount_usd, 0),
+        'number_buys': is_buy.astype(np.int64),
+        'number_sells': is_sell.astype(np.int64),
+        'first_block_time': block_time,
+        'last_block_time': block_time,
+    })
+    grouped = trades.groupby(BUCKET_KEY, sort=False, dropna=False)
+    daily = grouped[SUM_COLUMNS].sum()
+    daily['first_block_time'] = grouped['first_block_time'].min().dt.strftime(TIMESTAMP_FORMAT).str[:-3]
+    daily['last_block_time'] = grouped['last_block_time'].max().dt.strftime(TIMESTAMP_FORMAT).str[:-3]
+    return daily.reset_index()[AGGREGATE_COLUMNS]
+
+
+def filter_window(daily_df, start_date, end_date=None):
+    """Keep buckets with start_date <= block_date <= end_date (inclusive 'YYYY-MM-DD' strings)."""
+    mask = daily_df['block_date'] >= start_date
+    if end_date is not None:
+        mask &= daily_df['block_date'] <= end_date
+    return daily_df[mask]
+
+
+def window_start(day, today=None):
+    """First date of the DATE_ADD('day', day, CURRENT_DATE) window used by the Dune queries, as 'YYYY-MM-DD'."""
+    today = today or datetime.now(timezone.utc).date()
+    return (today + timedelta(days=int(day))).strftime('%Y-%m-%d')
+
+
+def requery_start(last_block_time, lookback_days):
+    """Midnight lookback_days before the day of last_block_time, where a delta query starts re-reading trades.
+
+    Dune indexes some trades late, with a block_time at or before the newest
+    one already stored, so the days around the sync point are fetched again.
+    """
+    day = parse_timestamps([last_block_time])[0].normalize() - timedelta(days=lookback_days)
+    return day.strftime(TIMESTAMP_FORMAT)[:-3]
+
+
+def format_durations(seconds):
+    """Vectorized version of the time_traded CASE in transaction.sql ('1d 2h 3m 4s', '5m 6s', ...)."""
+    seconds = pd.Series(seconds, dtype='int64')
+    days = (seconds // 86400).astype(str)
+    hours = (seconds % 86400 // 3600).astype(str)
+    minutes = (seconds % 3600 // 60).astype(str)
+    secs = (seconds % 60).astype(str)
+    text = secs + 's'
+    text = text.mask(seconds >= 60, minutes + 'm ' + text)
+    text = text.mask(seconds >= 3600, hours + 'h ' + minutes + 'm ' + secs + 's')
+    text = text.mask(seconds >= 86400, days + 'd ' + hours + 'h ' + minutes + 'm ' + secs + 's')
+    return text.to_numpy()
+
+
+def build_transaction_df(daily_df, spec):
+    """Roll daily buckets up to the per-token table that the chain's transaction.sql returns."""
+    if daily_df.empty:
+        return pd.DataFrame(columns=[name for name, _ in spec['transaction_columns']])
+
+    daily_df = daily_df.assign(
+        first_block_time=pd.to_datetime(daily_df['first_block_time']),
+        last_block_time=pd.to_datetime(daily_df['last_block_time']),
+    )
+    grouped = daily_df.groupby(['token_symbol', 'token_address', 'maker'], sort=False, dropna=False)
+    tokens = grouped[SUM_COLUMNS].sum()
+    tokens['first_block_time'] = grouped['first_block_time'].min()
+    tokens['last_block_time'] = grouped['last_block_time'].max()
+    tokens = tokens.reset_index()
+    tokens = tokens[tokens['token_symbol'] != spec['excluded_token_symbol']]
+    tokens = tokens.sort_values('first_block_time', ascending=False, kind='stable').reset_index(drop=True)
+
+    first = tokens['first_block_time']
+    last = tokens['last_block_time']
+    duration = ((last - first).dt.total_seconds()).astype(np.int64).to_numpy()
+    spent = tokens['spent_amount'].to_numpy(dtype=float)
+    delta = tokens['earned_amount'].to_numpy(dtype=float) - spent
+    one_sided = (tokens['number_buys'].to_numpy() == 0) | (tokens['number_sells'].to_numpy() == 0)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        delta_percentage = np.where(spent > 0, delta / spent * 100, -100)
+
+    derived = {
+        'token_symbol': tokens['token_symbol'],
+        'time_traded_seconds': np.where(one_sided, 0, duration),
+        'time_traded_text': format_durations(duration),
+        'incoming': tokens['incoming'],
+        'outcome': tokens['outcome'],
+        'delta_token': tokens['incoming'] - tokens['outcome'],
+        'spent_amount': tokens['spent_amount'],
+        'earned_amount': tokens['earned_amount'],
+        'spent_usd': tokens['spent_usd'],
+        'earned_usd': tokens['earned_usd'],
+        'number_buys': tokens['number_buys'].astype(np.int64),
+        'number_sells': tokens['number_sells'].astype(np.int64),
+        'delta': delta,
+        'delta_percentage': delta_percentage,
+        'dexscreener': (
+            f"https://dexscreener.com/{spec['dexscreener_slug']}/"
+            + tokens['token_address'].astype(str) + '?maker=' + tokens['maker'].astype(str)
+        ),
+        'first_trade_date': first.dt.strftime('%d.%m.%Y'),
+    }
+    return pd.DataFrame({name: derived[source] for name, source in spec['transaction_columns']})
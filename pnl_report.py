@@ -0,0 +1,615 @@
+
+import asyncio
+import io
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import FIRST_EXCEPTION, ThreadPoolExecutor, wait
+import pandas as pd
+from dune_client.query import QueryBase
+from dune_client.types import QueryParameter
+from openpyxl import Workbook
+from openpyxl.cell import Cell
+from openpyxl.formatting.rule import Rule
+from openpyxl.styles import PatternFill, Font, Alignment, Border, NamedStyle, Side
+from openpyxl.styles.differential import DifferentialStyle
+from openpyxl.utils import get_column_letter
+from aggregate_store import get_aggregate_store
+from chain_specs import CHAIN_SPECS
+from dune_cache import get_query_cache
+from dune_clients import get_async_dune_client, get_dune_client
+from dune_scheduler import get_dune_scheduler
+from instrumentation import span
+from pnl_aggregates import aggregate_raw_trades, build_transaction_df, filter_window, normalize_aggregates, requery_start, window_start
+from pnl_summary import summarize_transactions
+
+# Shared style objects, reused for every cell instead of being rebuilt per cell
+RED_FILL = PatternFill(start_color="FFC7CE", end_color="FFC7CE", fill_type="solid")
+GOLD_FILL = PatternFill(start_color="FFD700", end_color="FFD700", fill_type="solid")
+THIN_SIDE = Side(style='thin')
+THIN_BORDER = Border(left=THIN_SIDE, right=THIN_SIDE, top=THIN_SIDE, bottom=THIN_SIDE)
+CENTER_ALIGNMENT = Alignment(horizontal="center", vertical="center")
+BOLD_FONT = Font(bold=True)
+HYPERLINK_FONT = Font(color="0000FF", underline="single")
+# Conditional-formatting styles for the transaction rows; a solid fill in a rule takes its colour from bgColor
+BROWN_RULE_STYLE = DifferentialStyle(fill=PatternFill(bgColor="A52A2A", fill_type="solid"))
+RED_RULE_STYLE = DifferentialStyle(fill=PatternFill(bgColor="FFC7CE", fill_type="solid"))
+GREEN_RULE_STYLE = DifferentialStyle(fill=PatternFill(bgColor="C6EFCE", fill_type="solid"))
+LINK_RULE_STYLE = DifferentialStyle(font=HYPERLINK_FONT)
+
+# Reports with at least this many transactions are streamed through openpyxl's write-only
+# workbook, which keeps memory flat instead of holding a cell object per value. openpyxl
+# only streams rows to disk when lxml is installed; without it the sheet XML is buffered.
+STREAMING_ROWS = int(os.getenv('REPORT_STREAMING_ROWS', '10000'))
+# Transactions converted to cells at a time by stream_sheet
+STREAMING_CHUNK_ROWS = 5000
+SUMMARY_FORMAT_COLUMNS = ['total_spent_amount', 'actual_profit', 'win_rate', 'pnl_r', 'pnl_l', 'loss_rate']
+
+# Columnar export formats: file suffix and a writer taking (DataFrame, path or binary buffer).
+# parquet and arrow (Arrow IPC / Feather v2) need pyarrow.
+EXPORT_FORMATS = {
+    'parquet': ('.parquet', lambda df, target: df.to_parquet(target, index=False)),
+    'arrow': ('.arrow', lambda df, target: df.to_feather(target)),
+    'csv.gz': ('.csv.gz', lambda df, target: df.to_csv(target, index=False, compression={'method': 'gzip'})),
+}
+# Derived transaction columns (see transaction_columns) that are not plain float amounts
+TEXT_COLUMNS = {'token_symbol', 'time_traded_text', 'dexscreener'}
+INTEGER_COLUMNS = {'time_traded_seconds', 'number_buys', 'number_sells'}
+
+
+def trade_count(transaction_df):
+    """Buys plus sells in a transaction table, or its row count when it has no trade counts."""
+    if {'number_buys', 'number_sells'} <= set(transaction_df.columns):
+        counts = transaction_df[['number_buys', 'number_sells']].apply(pd.to_numeric, errors='coerce')
+        return int(counts.sum().sum())
+    return len(transaction_df)
+
+
+class PnlReportEngine:
+    """Builds the PnL workbook for one wallet on any chain described in CHAIN_SPECS."""
+
+    def __init__(self, chain, wallet_address, day='-30', user=None):
+        self.chain = chain
+        self.spec = CHAIN_SPECS[chain]
+        self.wallet_address = wallet_address
+        # Shared across reports; also loads .env on first use
+        self.dune = get_dune_client()
+        self.query_cache = get_query_cache()
+        # Paces Dune executions and books their credits against user (None for the CLI)
+        self.scheduler = get_dune_scheduler()
+        self.user = user
+        self.TRANSACTION_QUERY_ID = self.spec['transaction_query_id']
+        self.SUMMARY_QUERY_ID = self.spec['summary_query_id']
+        self.AGGREGATE_QUERY_ID = int(os.getenv(f'{chain.upper()}_AGGREGATE_QUERY_ID', '0')) or self.spec['aggregate_query_id']
+        # Refresh from locally stored daily aggregates plus a delta query when the chain supports it
+        self.incremental = bool(self.AGGREGATE_QUERY_ID) and os.getenv('PNL_INCREMENTAL', 'true').lower() != 'false'
+        # Days before the last stored trade that each delta query reads again, for trades Dune indexes late
+        self.lookback_days = int(os.getenv('PNL_LOOKBACK_DAYS', '1'))
+        # Summary metrics are derived from transaction_df unless DUNE_LOCAL_SUMMARY=false
+        self.local_summary = os.getenv('DUNE_LOCAL_SUMMARY', 'true').lower() != 'false'
+        self.day = day
+        self.parameters = [
+            QueryParameter.text_type(name='day', value=self.day),
+            QueryParameter.text_type(name='wallet', value=self.wallet_address)
+        ]
+        # self.output_file_path = f"{self.wallet_address}.xlsx"
+        self.reports_folder = "reports"
+        self.output_file_path = os.path.join(self.reports_folder, f"{self.wallet_address}.xlsx")
+
+        self.summary_df = None
+        self.transaction_df = None
+
+    def fetch_data(self):
+        with span('fetch_data', chain=self.chain) as stage:
+            self._fetch_data(self._scheduled(self.dune))
+            stage.rows = len(self.transaction_df)
+        self._record_activity()
+
+    def _fetch_data(self, dune):
+        if self.incremental:
+            since = get_aggregate_store().last_block_time(self.chain, self.wallet_address)
+            delta_df = dune.run_query_dataframe(self._aggregate_query(since))
+            self._apply_aggregates(delta_df, since)
+            return
+
+        transaction_query = QueryBase(query_id=self.TRANSACTION_QUERY_ID, params=self.parameters)
+        if self.local_summary:
+            # summary_tx.sql re-runs the transaction query as a subquery, so aggregate the rows we already have
+            self.transaction_df = self.query_cache.run_query_dataframe(dune, transaction_query)
+            self.transaction_df.columns = [col.lower() for col in self.transaction_df.columns]
+            self.summary_df = summarize_transactions(self.transaction_df, self.wallet_address, self.day, self.spec)
+            return
+
+        summary_query = QueryBase(query_id=self.SUMMARY_QUERY_ID, params=self.parameters)
+
+        # Both executions are submitted together, so latency is the slower of the two rather than their sum.
+        # If one leg fails, the other is cancelled on Dune at its next poll rather than run to completion.
+        abandoned = threading.Event()
+        dune = dune.abandonable(abandoned)
+        executor = ThreadPoolExecutor(max_workers=2)
+        try:
+            transaction_future = executor.submit(self.query_cache.run_query_dataframe, dune, transaction_query)
+            summary_future = executor.submit(self.query_cache.run_query_dataframe, dune, summary_query)
+            done, _ = wait([transaction_future, summary_future], return_when=FIRST_EXCEPTION)
+            for future in done:
+                # Raise a failed leg's error before blocking on the other one
+                future.result()
+            self.transaction_df = transaction_future.result()
+            self.summary_df = summary_future.result()
+        except BaseException:
+            abandoned.set()
+            raise
+        finally:
+            # If one leg failed, raise right away instead of waiting on the other
+            executor.shutdown(wait=False, cancel_futures=True)
+
+        self.transaction_df.columns = [col.lower() for col in self.transaction_df.columns]
+        self.summary_df.columns = [col.lower() for col in self.summary_df.columns]
+
+    async def fetch_data_async(self, on_progress=None):
+        """Same as fetch_data, but waits on Dune from the event loop instead of holding a thread.
+
+        on_progress(stage, detail) is called on the loop as the report advances:
+        'query' (what is being queried), 'state' (each Dune execution state),
+        'rows' (rows received) and 'summary' (summary_df, before any rendering).
+        """
+        with span('fetch_data', chain=self.chain) as stage:
+            dune = await asyncio.to_thread(self._scheduled, get_async_dune_client())
+            await self._fetch_data_async(dune, on_progress)
+            stage.rows = len(self.transaction_df)
+        await asyncio.to_thread(self._record_activity)
+
+    async def _fetch_data_async(self, dune, on_progress):
+        progress = on_progress or (lambda stage, detail: None)
+        on_state = lambda state: progress('state', state)
+        if self.incremental:
+            progress('query', 'new trades since the last refresh')
+            since = await asyncio.to_thread(get_aggregate_store().last_block_time, self.chain, self.wallet_address)
+            delta_df = await dune.run_query_dataframe(self._aggregate_query(since), on_state=on_state)
+            progress('rows', len(delta_df))
+            await asyncio.to_thread(self._apply_aggregates, delta_df, since)
+            progress('summary', self.summary_df)
+            return
+
+        transaction_query = QueryBase(query_id=self.TRANSACTION_QUERY_ID, params=self.parameters)
+        if self.local_summary:
+            progress('query', 'token trades')
+            self.transaction_df = await self.query_cache.run_query_dataframe_async(
+                dune, transaction_query, on_state=on_state
+            )
+            progress('rows', len(self.transaction_df))
+            self.transaction_df.columns = [col.lower() for col in self.transaction_df.columns]
+            self.summary_df = summarize_transactions(self.transaction_df, self.wallet_address, self.day, self.spec)
+            progress('summary', self.summary_df)
+            return
+
+        summary_query = QueryBase(query_id=self.SUMMARY_QUERY_ID, params=self.parameters)
+        progress('query', 'token trades and summary')
+        legs = [
+            asyncio.ensure_future(self.query_cache.run_query_dataframe_async(dune, transaction_query, on_state=on_state)),
+            asyncio.ensure_future(self.query_cache.run_query_dataframe_async(dune, summary_query, on_state=on_state)),
+        ]
+        try:
+            self.transaction_df, self.summary_df = await asyncio.gather(*legs)
+        except BaseException:
+            # gather leaves the other leg running; cancelling it cancels its Dune execution
+            for leg in legs:
+                leg.cancel()
+            raise
+        progress('rows', len(self.transaction_df))
+        self.transaction_df.columns = [col.lower() for col in self.transaction_df.columns]
+        self.summary_df.columns = [col.lower() for col in self.summary_df.columns]
+        progress('summary', self.summary_df)
+
+    @property
+    def activity_key(self):
+        """The wallet as recorded in the StateStore's wallet activity (EVM addresses lower-cased)."""
+        return self.wallet_address if self.spec['address_case_sensitive'] else self.wallet_address.lower()
+
+    def _scheduled(self, dune):
+        """dune behind the shared DuneScheduler, on the tier this wallet's last report calls for."""
+        if self.incremental and get_aggregate_store().last_block_time(self.chain, self.wallet_address):
+            # Only the trades since the last refresh are queried
+            expected = 0
+        else:
+            expected = self.scheduler.expected_trades(self.chain, [self.activity_key])
+        return self.scheduler.client(dune, user=self.user, chain=self.chain, expected_trades=expected)
+
+    def _record_activity(self):
+        self.scheduler.record_activity(self.chain, {self.activity_key: trade_count(self.transaction_df)})
+
+    def _requery_start(self, since):
+        """Where the delta query starts for since, the last block_time already stored for this wallet."""
+        return requery_start(since, self.lookback_days) if since else None
+
+    def _aggregate_query(self, since):
+        """Delta query for the trades from lookback_days before since on."""
+        start = self._requery_start(since) or '1970-01-01 00:00:00.000'
+        params = self.parameters + [QueryParameter.text_type(name='since', value=start)]
+        return QueryBase(query_id=self.AGGREGATE_QUERY_ID, params=params)
+
+    def _apply_aggregates(self, delta_df, since):
+        """Merge a delta queried for since into the stored buckets and rebuild transaction_df/summary_df."""
+        store = get_aggregate_store()
+        start = window_start(self.day)
+        # When another refresh merged first, this delta may be older than what it stored and is dropped;
+        # the report uses the stored buckets and the next refresh picks up any newer trades
+        store.merge(self.chain, self.wallet_address, normalize_aggregates(delta_df), since, self._requery_start(since))
+        store.prune(self.chain, self.wallet_address, start)
+        daily_df = store.load(self.chain, self.wallet_address, start)
+        self.transaction_df = build_transaction_df(daily_df, self.spec)
+        self.summary_df = summarize_transactions(self.transaction_df, self.wallet_address, self.day, self.spec)
+
+    def compute_from_trades(self, raw_df, start_date=None, end_date=None):
+        """Build transaction_df/summary_df from raw swap rows instead of Dune, for any date window."""
+        daily_df = aggregate_raw_trades(raw_df, self.spec, self.wallet_address)
+        daily_df = filter_window(daily_df, start_date or window_start(self.day), end_date)
+        self.transaction_df = build_transaction_df(daily_df, self.spec)
+        self.summary_df = summarize_transactions(self.transaction_df, self.wallet_address, self.day, self.spec)
+
+    def save_to_excel(self, target=None):
+        """Write the styled workbook to target, a path or binary buffer, defaulting to output_file_path."""
+        if target is None:
+            os.makedirs(self.reports_folder, exist_ok=True)
+            target = self.output_file_path
+        streaming = len(self.transaction_df) >= STREAMING_ROWS
+        with span('save_to_excel', chain=self.chain, writer='write_only' if streaming else 'openpyxl') as stage:
+            if streaming:
+                workbook = Workbook(write_only=True)
+                self.stream_sheet(workbook.create_sheet('Sheet1'))
+                workbook.save(target)
+            else:
+                with pd.ExcelWriter(target, engine='openpyxl') as writer:
+                    self.write_sheet(writer)
+            stage.rows = len(self.transaction_df)
+            stage.nbytes = os.path.getsize(target) if isinstance(target, str) else target.tell()
+        if isinstance(target, str):
+            print(f'Excel file with conditional formatting has been saved to {target}')
+
+    def write_sheet(self, writer, sheet_name='Sheet1'):
+        """Write summary, a blank row and transactions to one sheet of an open ExcelWriter and style it."""
+        self.summary_df.to_excel(writer, sheet_name=sheet_name, index=False, startrow=0)
+        pd.DataFrame([[]]).to_excel(writer, sheet_name=sheet_name, index=False, header=False, startrow=len(self.summary_df) + 1)
+        transactions = self.transaction_df.assign(dexscreener=dexscreener_links(self.transaction_df))
+        transactions.to_excel(writer, sheet_name=sheet_name, index=False, startrow=len(self.summary_df) + 2)
+        # Style the sheet while the writer still holds it so the workbook is serialized only once
+        with span('apply_formatting', chain=self.chain) as stage:
+            self.apply_formatting(writer.sheets[sheet_name])
+            stage.rows = writer.sheets[sheet_name].max_row
+
+    def stream_sheet(self, worksheet):
+        """Append the same styled layout as write_sheet + apply_formatting to a write-only worksheet.
+
+        Rows are built from the DataFrames STREAMING_CHUNK_ROWS at a time and
+        handed to openpyxl, which serializes them immediately, so memory does
+        not grow with the number of transactions. Delta fills and link styling
+        are the same conditional-formatting rules apply_formatting adds.
+        """
+        summary, transactions = self.summary_df, self.transaction_df
+        summary_columns, columns = list(summary.columns), list(transactions.columns)
+        if any(name not in summary_columns for name in SUMMARY_FORMAT_COLUMNS):
+            raise ValueError("Required summary columns not found in the Excel sheet.")
+        required = [self.spec['delta_column'], 'delta_percentage', 'dexscreener', 'number_buys',
+                    'number_sells', 'token_symbol', 'outcome', 'incoming']
+        if any(name not in columns for name in required):
+            raise ValueError("Required columns not found in the Excel sheet.")
+        delta_col = columns.index(self.spec['delta_column'])
+        delta_percentage_col = columns.index('delta_percentage')
+        dexscreener_col = columns.index('dexscreener')
+        width = max(len(summary_columns), len(columns))
+
+        # Write-only sheets need their column widths before the first row
+        for column, length in enumerate(streamed_column_widths([summary, transactions], width), start=1):
+            worksheet.column_dimensions[get_column_letter(column)].width = length + 2
+        worksheet.column_dimensions[get_column_letter(dexscreener_col + 1)].width = 20
+
+        styles = streaming_styles(worksheet.parent)
+
+        def row_cells(values, cell_styles=None):
+            cells = []
+            for i in range(width):
+                # What WriteOnlyCell builds, with the named style's ids passed in instead of looked up per cell
+                cell = Cell(worksheet, row=1, column=1, value=values[i] if i < len(values) else None,
+                            style_array=cell_styles[i] if cell_styles else styles['plain'])
+                cells.append(cell)
+            return cells
+
+        worksheet.append(row_cells(summary_columns, [styles['header']] * width))
+        pnl_r_col = summary_columns.index('pnl_r')
+        for position, values in enumerate(frame_rows(summary)):
+            cell_styles = [styles['plain']] * width
+            if position == 0 and values[pnl_r_col] is not None and values[summary_columns.index('total_spent_amount')] is not None:
+                try:
+                    profitable = float(values[pnl_r_col]) > float(values[summary_columns.index('total_spent_amount')])
+                    cell_styles[pnl_r_col] = styles['gold'] if profitable else styles['red']
+                except ValueError:
+                    pass
+            worksheet.append(row_cells(values, cell_styles))
+        worksheet.append(row_cells([]))
+        worksheet.append(row_cells(columns))
+
+        first_row = len(summary) + 4
+        add_transaction_rules(worksheet, delta_col + 1, delta_percentage_col + 1, dexscreener_col + 1,
+                              first_row, first_row + len(transactions) - 1)
+        for start in range(0, len(transactions), STREAMING_CHUNK_ROWS):
+            chunk = transactions.iloc[start:start + STREAMING_CHUNK_ROWS]
+            for values in frame_rows(chunk.assign(dexscreener=dexscreener_links(chunk))):
+                worksheet.append(row_cells(values))
+
+    def render_to_buffer(self):
+        """Render the workbook into memory without touching the reports folder."""
+        buffer = io.BytesIO()
+        self.save_to_excel(buffer)
+        buffer.seek(0)
+        return buffer
+
+    def typed_tables(self):
+        """summary_df and transaction_df with real dtypes: trade dates as datetime64, counts as int64, amounts as float64."""
+        transactions = self.transaction_df.reset_index(drop=True).copy()
+        for name, source in self.spec['transaction_columns']:
+            if name not in transactions.columns:
+                continue
+            if source == 'first_trade_date':
+                transactions[name] = pd.to_datetime(transactions[name], format='%d.%m.%Y', errors='coerce')
+            elif source in TEXT_COLUMNS:
+                transactions[name] = transactions[name].astype('string')
+            elif source in INTEGER_COLUMNS:
+                transactions[name] = pd.to_numeric(transactions[name], errors='coerce').fillna(0).astype('int64')
+            else:
+                transactions[name] = pd.to_numeric(transactions[name], errors='coerce').astype('float64')
+
+        summary = self.summary_df.reset_index(drop=True).copy()
+        for name in summary.columns:
+            if name in ('id', 'time_period_days'):
+                summary[name] = summary[name].astype('string')
+            elif name == 'number_of_tokens_traded':
+                summary[name] = pd.to_numeric(summary[name], errors='coerce').fillna(0).astype('int64')
+            else:
+                summary[name] = pd.to_numeric(summary[name], errors='coerce').astype('float64')
+        return summary, transactions
+
+    def export_names(self, fmt):
+        """File names of the summary and transactions tables for an export format."""
+        if fmt not in EXPORT_FORMATS:
+            raise ValueError(f"Unknown export format {fmt!r}; choose from {', '.join(EXPORT_FORMATS)}")
+        suffix = EXPORT_FORMATS[fmt][0]
+        return f"{self.wallet_address}_summary{suffix}", f"{self.wallet_address}_transactions{suffix}"
+
+    def render_export_bytes(self, fmt):
+        """Write both tables in a columnar format straight from the DataFrames; returns {file name: bytes}."""
+        names = self.export_names(fmt)
+        writer = EXPORT_FORMATS[fmt][1]
+        files = {}
+        with span('export', chain=self.chain, format=fmt) as stage:
+            for name, table in zip(names, self.typed_tables()):
+                buffer = io.BytesIO()
+                writer(table, buffer)
+                files[name] = buffer.getvalue()
+            stage.rows = len(self.transaction_df)
+            stage.nbytes = sum(len(data) for data in files.values())
+        return files
+
+    def export_tables(self, fmt, folder=None):
+        """Write the summary and transactions tables to folder (default reports_folder); returns their paths."""
+        folder = folder or self.reports_folder
+        os.makedirs(folder, exist_ok=True)
+        paths = []
+        for name, data in self.render_export_bytes(fmt).items():
+            path = os.path.join(folder, name)
+            with open(path, 'wb') as file:
+                file.write(data)
+            paths.append(path)
+        print(f"{fmt} export has been saved to {', '.join(paths)}")
+        return paths
+
+    def apply_formatting(self, worksheet):
+        # One streaming scan styles every cell and tracks the widest value per column
+        column_widths = {}
+        for row in worksheet.iter_rows(min_row=1, max_row=worksheet.max_row, min_col=1, max_col=worksheet.max_column):
+            for cell in row:
+                cell.border = THIN_BORDER
+                cell.alignment = CENTER_ALIGNMENT
+                if cell.row == 1:
+                    cell.font = BOLD_FONT
+                length = len(str(cell.value))
+                if length > column_widths.get(cell.column, 0):
+                    column_widths[cell.column] = length
+        for column, length in column_widths.items():
+            worksheet.column_dimensions[get_column_letter(column)].width = length + 2
+
+        summary_row = 1
+        total_spent_amount_col = None
+        actual_profit_col = None
+        win_rate_col = None
+        pnl_r_col = None
+        pnl_l_col = None
+        loss_rate_col = None
+
+        for cell in worksheet[summary_row]:
+            if cell.value == 'total_spent_amount':
+                total_spent_amount_col = cell.column
+            elif cell.value == 'actual_profit':
+                actual_profit_col = cell.column
+            elif cell.value == 'win_rate':
+                win_rate_col = cell.column
+            elif cell.value == 'pnl_r':
+                pnl_r_col = cell.column
+            elif cell.value == 'pnl_l':
+                pnl_l_col = cell.column
+            elif cell.value == 'loss_rate':
+                loss_rate_col = cell.column
+        
+
+        summary_cols = [total_spent_amount_col, actual_profit_col, win_rate_col, pnl_r_col, pnl_l_col, loss_rate_col]
+        if None in summary_cols:
+            raise ValueError("Required summary columns not found in the Excel sheet.")
+
+        header_row = 4
+        delta_col = None
+        delta_percentage_col = None
+        dexscreener_col = None
+        number_buys_col = None
+        number_sells_col = None
+        token_symbol_col = None
+        outcome_col = None
+        incoming_col = None
+
+        for cell in worksheet[header_row]:
+            if cell.value == self.spec['delta_column']:
+                delta_col = cell.column
+            elif cell.value == 'delta_percentage':
+                delta_percentage_col = cell.column
+            elif cell.value == 'dexscreener':
+                dexscreener_col = cell.column
+            elif cell.value == 'number_buys':
+                number_buys_col = cell.column
+            elif cell.value == 'number_sells':
+                number_sells_col = cell.column
+            elif cell.value == 'token_symbol':
+                token_symbol_col = cell.column
+            elif cell.value == 'outcome':
+                outcome_col = cell.column
+            elif cell.value == 'incoming':
+                incoming_col = cell.column
+        if dexscreener_col is not None:
+            dexscreener_column_letter = get_column_letter(dexscreener_col)
+            worksheet.column_dimensions[dexscreener_column_letter].width = 20
+
+        required_cols = [delta_col, delta_percentage_col, dexscreener_col, number_buys_col, number_sells_col, token_symbol_col, outcome_col, incoming_col]
+        if None in required_cols:
+            raise ValueError("Required columns not found in the Excel sheet.")
+
+        total_spent_amount_cell = worksheet.cell(row=summary_row + 1, column=total_spent_amount_col)
+        pnl_r_cell = worksheet.cell(row=summary_row + 1, column=pnl_r_col)
+
+        if pnl_r_cell.value is not None and total_spent_amount_cell.value is not None:
+            try:
+                pnl_r_value = float(pnl_r_cell.value)
+                total_spent_amount_value = float(total_spent_amount_cell.value)
+                if pnl_r_value > total_spent_amount_value:
+                    pnl_r_cell.fill = GOLD_FILL
+                else:
+                    pnl_r_cell.fill = RED_FILL
+            except ValueError:
+                pass
+
+        # Fills and link styling are evaluated by Excel over whole ranges; write_sheet already
+        # turned the links into HYPERLINK formulas, so no transaction row is visited here
+        add_transaction_rules(worksheet, delta_col, delta_percentage_col, dexscreener_col, header_row + 1, worksheet.max_row)
+
+    def generate_report(self):
+        self.fetch_data()
+        self.save_to_excel()
+
+    def render_report_bytes(self):
+        return self.render_to_buffer().getvalue()
+
+    def generate_report_bytes(self):
+        """Fetch and render the report in memory, returning the workbook bytes."""
+        self.fetch_data()
+        return self.render_report_bytes()
+
+def format_table_sheet(worksheet):
+    """Border, center and size every cell of a plain one-table sheet, with a bold header row."""
+    column_widths = {}
+    for row in worksheet.iter_rows(min_row=1, max_row=worksheet.max_row, max_col=worksheet.max_column):
+        for cell in row:
+            cell.border = THIN_BORDER
+            cell.alignment = CENTER_ALIGNMENT
+            if cell.row == 1:
+                cell.font = BOLD_FONT
+            column_widths[cell.column] = max(column_widths.get(cell.column, 0), len(str(cell.value)))
+    for column, length in column_widths.items():
+        worksheet.column_dimensions[get_column_letter(column)].width = length + 2
+
+
+def frame_rows(df):
+    """Rows of df as lists of plain Python values, with NaN as None (an empty cell, as pandas writes it)."""
+    return df.astype(object).where(df.notna(), None).to_numpy().tolist()
+
+
+def dexscreener_links(transactions):
+    """The dexscreener column with each link on a numeric delta_percentage row as a =HYPERLINK() formula.
+
+    A formula instead of cell.hyperlink keeps the per-cell hyperlink records
+    and relationships out of the workbook.
+    """
+    urls = transactions['dexscreener']
+    linked = pd.to_numeric(transactions['delta_percentage'], errors='coerce').notna() & urls.fillna('').astype(bool)
+    formulas = '=HYPERLINK("' + urls.astype(str).str.replace('"', '""', regex=False) + '", "Dexscreener transaction")'
+    return urls.astype(object).where(~linked, formulas)
+
+
+def add_transaction_rules(worksheet, delta_col, delta_percentage_col, dexscreener_col, first_row, last_row):
+    """Colour delta cells and style links over transaction rows first_row..last_row with conditional formatting.
+
+    delta_percentage of -100 is brown (its delta red), above 0 green and
+    below 0 red; numeric rows get the hyperlink font on dexscreener. Columns
+    are 1-based.
+    """
+    if last_row < first_row:
+        return
+    percentage = f'${get_column_letter(delta_percentage_col)}{first_row}'
+    percentage_range, delta_range, link_range = (
+        f'{get_column_letter(column)}{first_row}:{get_column_letter(column)}{last_row}'
+        for column in (delta_percentage_col, delta_col, dexscreener_col)
+    )
+    numeric = f'ISNUMBER({percentage})'
+    rules = worksheet.conditional_formatting
+    # Rules added earlier take priority, so -100 stays brown rather than red
+    rules.add(percentage_range, Rule(type='expression', formula=[f'AND({numeric},{percentage}=-100)'],
+                                     dxf=BROWN_RULE_STYLE, stopIfTrue=True))
+    rules.add(f'{percentage_range} {delta_range}', Rule(type='expression', formula=[f'AND({numeric},{percentage}>0)'],
+                                                         dxf=GREEN_RULE_STYLE))
+    rules.add(f'{percentage_range} {delta_range}', Rule(type='expression', formula=[f'AND({numeric},{percentage}<0)'],
+                                                         dxf=RED_RULE_STYLE))
+    link = f'${get_column_letter(dexscreener_col)}{first_row}'
+    rules.add(link_range, Rule(type='expression', formula=[f'AND({numeric},{link}<>"")'], dxf=LINK_RULE_STYLE))
+
+
+def streamed_column_widths(frames, width):
+    """Widest str() of any header or value per column across frames stacked in one sheet, like apply_formatting.
+
+    Empty cells count as 'None', which the blank separator row guarantees for
+    every column; NaN's 'nan' is shorter, so it never decides a width.
+    """
+    widths = [len('None')] * width
+    for frame in frames:
+        for i, name in enumerate(frame.columns):
+            widths[i] = max(widths[i], len(str(name)))
+            values = frame[name]
+            for start in range(0, len(values), STREAMING_CHUNK_ROWS):
+                chunk = values.iloc[start:start + STREAMING_CHUNK_ROWS].tolist()
+                widths[i] = max(widths[i], max(map(len, map(str, chunk))))
+    return widths
+
+
+def streaming_styles(workbook):
+    """Named styles for stream_sheet's cells, added to workbook once, as the style arrays cells are built with.
+
+    The font/fill/border/alignment setters would look every style up in the
+    workbook again for each cell, which doubles the cost of streaming a report.
+    """
+    arrays = {}
+    for key, attributes in (('plain', {}), ('header', {'font': BOLD_FONT}), ('gold', {'fill': GOLD_FILL}), ('red', {'fill': RED_FILL})):
+        style = NamedStyle(name=f'pnl_{key}', border=THIN_BORDER, alignment=CENTER_ALIGNMENT, **attributes)
+        workbook.add_named_style(style)
+        arrays[key] = style.as_tuple()
+    return arrays
+
+
+def archive_report(report_bytes, chain, wallet_address, folder):
+    """Store a copy of rendered report bytes under folder with a unique, timestamped name."""
+    os.makedirs(folder, exist_ok=True)
+    timestamp = time.strftime('%Y%m%d-%H%M%S')
+    path = os.path.join(folder, f"{chain}_{wallet_address}_{timestamp}_{uuid.uuid4().hex[:8]}.xlsx")
+    with open(path, 'wb') as file:
+        file.write(report_bytes)
+    return path
+
+if __name__ == "__main__":
+    chain = input(f"Enter the chain ({', '.join(CHAIN_SPECS)}): ").strip().lower()
+    wallet_address = input("Enter the wallet address: ")
+    report = PnlReportEngine(chain, wallet_address)
+    report.generate_report()
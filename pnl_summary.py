@@ -0,0 +1,50 @@
+import numpy as np
+import pandas as pd
+
+
+def summarize_transactions(transaction_df, wallet_address, day, spec):
+    """Derive the Dune summary_df row locally from the transaction_df of the same wallet and window.
+
+    spec is the chain's entry in chain_specs.CHAIN_SPECS.
+    """
+    delta = transaction_df[spec['delta_column']].to_numpy(dtype=float)
+    percentage = transaction_df['delta_percentage'].to_numpy(dtype=float)
+    spent = transaction_df['spent_amount'].to_numpy(dtype=float)
+    wins = percentage > 0
+    losses = percentage < 0
+    count = len(transaction_df)
+
+    def total(values):
+        # SUM over an empty result set is NULL in SQL, not 0
+        return values.sum() if count else np.nan
+
+    pnl_r = total(np.where(wins, delta, 0))
+    pnl_l = total(np.where(losses, delta, 0))
+    abs_loss = total(np.where(losses, np.abs(delta), 0))
+    abs_total = total(np.abs(delta))
+    number_wins = total(wins.astype(float))
+    number_losses = total(losses.astype(float))
+    total_spent = total(spent)
+
+    # Dune evaluates these as DOUBLE, so division by zero yields inf/nan rather than an error
+    with np.errstate(divide='ignore', invalid='ignore'):
+        metrics = {
+            'id': wallet_address,
+            'number_of_tokens_traded': transaction_df['token_symbol'].nunique(),
+            'total_spent_amount': total_spent,
+            'actual_profit': pnl_r - pnl_l - total_spent if spec['actual_profit_includes_losses'] else pnl_r - total_spent,
+            'pnl_r': pnl_r,
+            'pnl_l': pnl_l,
+            'win_rate': np.float64(number_wins) / count * 100 if count else np.nan,
+            'loss_rate': np.float64(number_losses) / count * 100 if count else np.nan,
+            'weighted_win_rate': np.float64(pnl_r) / abs_total * 100,
+            'weighted_loss_rate': np.float64(abs_loss) / abs_total * 100,
+            'profitability_index': np.float64(pnl_r) / abs(pnl_l),
+            'avg_profit_per_win': np.float64(pnl_r) / number_wins,
+            'avg_loss_per_loss': np.float64(abs_loss) / number_losses,
+            'trade_efficiency': np.float64(total(delta)) / count if count else np.nan,
+            'time_period_days': str(day),
+        }
+
+    columns = spec['summary_columns']
+    return pd.DataFrame([[metrics[column] for column in columns]], columns=columns)
@@ -0,0 +1,146 @@
+import asyncio
+import itertools
+import logging
+import os
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+
+class QueueFullError(Exception):
+    """Raised when a user already has the maximum number of queued report jobs."""
+
+
+class JobCancelledError(Exception):
+    """Set on a job's future when the job is cancelled while still queued."""
+
+
+class ReportJob:
+    def __init__(self, job_id, user, func, description):
+        self.id = job_id
+        self.user = user
+        self.func = func
+        self.description = description
+        self.state = 'queued'
+        self.future = asyncio.get_running_loop().create_future()
+
+
+class ReportScheduler:
+    """Bounded worker pool that serves queued report jobs round-robin across users.
+
+    A fixed number of asyncio workers take jobs from per-user queues, one user at
+    a time, so a user who submits a burst cannot starve everyone else. Blocking
+    work inside a job should go through run_blocking, which uses a bounded thread
+    pool (REPORT_RENDER_THREADS) instead of the unbounded default executor. Jobs
+    that wait on Dune asynchronously hold no thread, so REPORT_WORKERS can be
+    much larger than the thread pool.
+    """
+
+    def __init__(self, workers=None, max_queued_per_user=None, render_threads=None):
+        self.workers = workers or int(os.getenv('REPORT_WORKERS', '4'))
+        self.max_queued_per_user = max_queued_per_user or int(os.getenv('REPORT_MAX_QUEUED_PER_USER', '5'))
+        render_threads = render_threads or int(os.getenv('REPORT_RENDER_THREADS', str(min(self.workers, os.cpu_count() or 1))))
+        self.executor = ThreadPoolExecutor(max_workers=render_threads, thread_name_prefix='report')
+        self._queues = {}
+        self._user_order = deque()
+        self._jobs = {}
+        self._ids = itertools.count(1)
+        self._pending = None
+        self._worker_tasks = []
+
+    def _ensure_workers(self):
+        if self._worker_tasks:
+            return
+        self._pending = asyncio.Semaphore(0)
+        self._worker_tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    def submit(self, user, func, description=''):
+        """Queue func, a zero-argument coroutine function, and return its ReportJob."""
+        self._ensure_workers()
+        queue = self._queues.get(user)
+        if queue is not None and len(queue) >= self.max_queued_per_user:
+            raise QueueFullError(f"You already have {len(queue)} reports queued. Please wait for them to finish.")
+        job = ReportJob(next(self._ids), user, func, description)
+        self._jobs[job.id] = job
+        if queue is None:
+            self._queues[user] = queue = deque()
+            self._user_order.append(user)
+        queue.append(job)
+        self._pending.release()
+        logger.info(f'Queued job {job.id} ({description}) for {user} at position {self.position(job.id)}')
+        return job
+
+    def position(self, job_id):
+        """Return the 1-based place of a queued job in round-robin service order, or 0 if it is not queued."""
+        job = self._jobs.get(job_id)
+        if job is None or job.state != 'queued':
+            return 0
+        queue = self._queues[job.user]
+        rank = queue.index(job)
+        user_index = self._user_order.index(job.user)
+        ahead = rank
+        for index, user in enumerate(self._user_order):
+            if user != job.user:
+                ahead += min(len(self._queues[user]), rank + 1 if index < user_index else rank)
+        return ahead + 1
+
+    def cancel(self, job_id):
+        """Cancel a queued job. Jobs that are already running cannot be cancelled."""
+        job = self._jobs.get(job_id)
+        if job is None or job.state != 'queued':
+            return False
+        queue = self._queues[job.user]
+        queue.remove(job)
+        if not queue:
+            del self._queues[job.user]
+            self._user_order.remove(job.user)
+        job.state = 'cancelled'
+        # The future is already cancelled when the caller awaiting it was
+        if not job.future.done():
+            job.future.set_exception(JobCancelledError(f"Report job {job.id} was cancelled"))
+        del self._jobs[job_id]
+        return True
+
+    def jobs(self):
+        return list(self._jobs.values())
+
+    async def run_blocking(self, func, *args):
+        """Run a blocking callable on the scheduler's bounded thread pool."""
+        return await asyncio.get_running_loop().run_in_executor(self.executor, func, *args)
+
+    def _next_job(self):
+        if not self._user_order:
+            return None
+        user = self._user_order.popleft()
+        queue = self._queues[user]
+        job = queue.popleft()
+        if queue:
+            self._user_order.append(user)
+        else:
+            del self._queues[user]
+        return job
+
+    async def _worker(self):
+        while True:
+            await self._pending.acquire()
+            job = self._next_job()
+            # Cancelled jobs leave a spare permit behind
+            if job is None:
+                continue
+            job.state = 'running'
+            try:
+                result = await job.func()
+            except asyncio.CancelledError:
+                job.future.cancel()
+                raise
+            except Exception as e:
+                job.state = 'failed'
+                if not job.future.done():
+                    job.future.set_exception(e)
+            else:
+                job.state = 'done'
+                if not job.future.done():
+                    job.future.set_result(result)
+            finally:
+                self._jobs.pop(job.id, None)
@@ -0,0 +1,82 @@
+import asyncio
+import importlib
+import logging
+import os
+import sys
+import tempfile
+import time
+from types import SimpleNamespace
+
+from dotenv import load_dotenv
+
+logger = logging.getLogger(__name__)
+
+# Modules the bots build reports with. Between them they pull in pandas, openpyxl and
+# dune_client, most of a second of imports that /start and the chain buttons do not need.
+REPORT_MODULES = ('pnl_report', 'batch_report', 'cross_chain_report', 'dune_cache', 'dune_clients')
+HEAVY_MODULES = ('pandas', 'numpy', 'openpyxl', 'dune_client', 'pyarrow')
+
+_loading = None
+
+
+def import_report_stack():
+    """Import every report module in this thread; returns them as attributes named after each module."""
+    start = time.perf_counter()
+    modules = {name: importlib.import_module(name) for name in REPORT_MODULES}
+    logger.info(f'Report stack loaded in {time.perf_counter() - start:.2f}s')
+    return SimpleNamespace(**modules)
+
+
+async def load_report_stack():
+    """The report modules, imported on a worker thread the first time so the event loop keeps serving updates.
+
+    Every caller awaits the same import, whether it was started by
+    prewarm_report_stack or by the first report.
+    """
+    global _loading
+    if _loading is None:
+        _loading = asyncio.ensure_future(asyncio.to_thread(import_report_stack))
+    return await _loading
+
+
+async def close_report_stack():
+    """Close the shared async Dune clients of this event loop, if a report or the pre-warm loaded the stack."""
+    if _loading is None:
+        return
+    try:
+        stack = await _loading
+    except Exception:
+        return
+    await stack.dune_clients.close_async_dune_clients()
+
+
+def prewarm_report_stack():
+    """Start loading the report stack in the background unless PNL_PREWARM_REPORTS=false."""
+    if os.getenv('PNL_PREWARM_REPORTS', 'true').lower() != 'false':
+        asyncio.ensure_future(load_report_stack())
+
+
+def profile_startup(started, build_bot):
+    """Print how long the bot module took to import, build_bot() to run and the report stack to load.
+
+    started is time.perf_counter() taken before the bot module's own imports.
+    build_bot must build the telegram Application, so "bot ready" is the
+    moment the bot could start polling. Its state goes to a throwaway store.
+    """
+    imported = time.perf_counter()
+    load_dotenv()
+    # Nothing is sent to Telegram, so any well-formed token will do
+    if not os.getenv('TELEGRAM_TOKEN'):
+        os.environ['TELEGRAM_TOKEN'] = '0:profile-startup'
+    with tempfile.TemporaryDirectory(prefix='profile_startup_') as folder:
+        os.environ['PNL_STATE_PATH'] = os.path.join(folder, 'pnl_state.sqlite3')
+        build_bot()
+        built = time.perf_counter()
+    preloaded = [name for name in HEAVY_MODULES if name in sys.modules]
+    import_report_stack()
+    loaded = time.perf_counter()
+
+    print(f"{'imports':<14} {imported - started:8.3f}s")
+    print(f"{'bot ready':<14} {built - started:8.3f}s")
+    print(f"{'report stack':<14} {loaded - built:8.3f}s")
+    print(f"report dependencies imported at startup: {', '.join(preloaded) or 'none'}")
@@ -0,0 +1,86 @@
+import asyncio
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class DetachedError(Exception):
+    """Raised from SingleFlight.do in a caller that was detached from the work it was waiting on."""
+
+
+class _Flight:
+    def __init__(self, work):
+        self.work = work
+        self.waiters = {}  # waiter -> the future its do() call awaits, in arrival order
+
+
+class SingleFlight:
+    """Collapses concurrent async calls that share a key into one execution.
+
+    The first caller for a key (the leader) starts the work. Callers that
+    arrive while it is still running wait on the same work and get the same
+    result or exception. A caller stops waiting when it is cancelled or
+    detached; the work itself is cancelled only once no caller is waiting on
+    it. The key is released as soon as the work finishes, so a later call
+    starts fresh.
+    """
+
+    def __init__(self):
+        self._in_flight = {}
+
+    def in_flight(self, key):
+        return key in self._in_flight
+
+    def waiters(self, key):
+        """The waiters passed to do() by the callers still waiting on key, in arrival order."""
+        flight = self._in_flight.get(key)
+        return list(flight.waiters) if flight else []
+
+    async def do(self, key, func, waiter=None):
+        """Run func() for key unless a call for key is already running, then await its result.
+
+        waiter identifies this caller to waiters() and detach(); it must be
+        hashable and unique among the callers of key.
+        """
+        flight = self._in_flight.get(key)
+        # A flight without waiters is being cancelled, so it cannot be joined
+        if flight is None or not flight.waiters:
+            flight = _Flight(asyncio.ensure_future(func()))
+            self._in_flight[key] = flight
+            flight.work.add_done_callback(lambda _: self._finish(key, flight))
+        else:
+            logger.info(f'Joining in-flight request for {key}')
+        waiter = object() if waiter is None else waiter
+        result = asyncio.get_running_loop().create_future()
+        flight.waiters[waiter] = result
+        try:
+            return await result
+        finally:
+            del flight.waiters[waiter]
+            if not flight.waiters and not flight.work.done():
+                flight.work.cancel()
+
+    def detach(self, key, waiter):
+        """Make waiter's do() call raise DetachedError; returns False if it is not waiting on key."""
+        flight = self._in_flight.get(key)
+        result = flight.waiters.get(waiter) if flight else None
+        if result is None or result.done():
+            return False
+        result.set_exception(DetachedError(f'Detached from {key}'))
+        return True
+
+    def _finish(self, key, flight):
+        if self._in_flight.get(key) is flight:
+            del self._in_flight[key]
+        work = flight.work
+        # Retrieve the outcome even when nobody is left to receive it
+        error = None if work.cancelled() else work.exception()
+        for result in flight.waiters.values():
+            if result.done():
+                continue
+            if work.cancelled():
+                result.cancel()
+            elif error is not None:
+                result.set_exception(error)
+            else:
+                result.set_result(work.result())
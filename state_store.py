@@ -0,0 +1,417 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+
+from report_scheduler import QueueFullError
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS sessions (
+    user_id TEXT PRIMARY KEY,
+    data TEXT NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS allowed_users (
+    username TEXT PRIMARY KEY COLLATE NOCASE,
+    added_by TEXT,
+    added_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS state_meta (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id TEXT NOT NULL,
+    chat_id INTEGER,
+    kind TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    description TEXT NOT NULL,
+    state TEXT NOT NULL,
+    worker TEXT,
+    lease_until REAL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    error TEXT,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS jobs_by_state ON jobs (state, id);
+CREATE TABLE IF NOT EXISTS dune_credits (
+    day TEXT NOT NULL,
+    user_id TEXT NOT NULL,
+    chain TEXT NOT NULL,
+    performance TEXT NOT NULL,
+    executions INTEGER NOT NULL,
+    credits REAL NOT NULL,
+    PRIMARY KEY (day, user_id, chain, performance)
+);
+CREATE TABLE IF NOT EXISTS wallet_activity (
+    chain TEXT NOT NULL,
+    wallet TEXT NOT NULL,
+    trades INTEGER NOT NULL,
+    updated_at REAL NOT NULL,
+    PRIMARY KEY (chain, wallet)
+);
+"""
+
+JOB_COLUMNS = 'id, user_id, chat_id, kind, payload, description, state, worker, attempts, error'
+
+# The oldest queued job of the user with the fewest running jobs, so a burst from one
+# user is interleaved with everyone else's across all workers. A running job whose lease
+# has expired lost its worker and is claimed again, unless it has used up its attempts;
+# reap_jobs then fails it instead of letting a job that kills its worker loop forever.
+CLAIM = f"""
+UPDATE jobs SET state = 'running', worker = :worker, lease_until = :lease_until,
+    attempts = attempts + 1, updated_at = :now
+WHERE id = (
+    SELECT id FROM jobs AS candidate
+    WHERE candidate.state = 'queued' OR (
+        candidate.state = 'running' AND candidate.lease_until < :now AND candidate.attempts < :max_attempts
+    )
+    ORDER BY (
+        SELECT COUNT(*) FROM jobs AS busy
+        WHERE busy.user_id = candidate.user_id AND busy.state = 'running' AND busy.lease_until >= :now
+    ), candidate.id
+    LIMIT 1
+)
+RETURNING {JOB_COLUMNS}
+"""
+
+# Place of a queued job in CLAIM order. CLAIM takes each user's queued jobs oldest first and
+# the n-th of them (0-based) goes when that user has n more running jobs than now, so sorting
+# by (running jobs + n, id) gives the order in which claims will pick them up
+POSITION = """
+WITH busy AS (
+    SELECT user_id, COUNT(*) AS running FROM jobs
+    WHERE state = 'running' AND lease_until >= :now
+    GROUP BY user_id
+),
+waiting AS (
+    SELECT id, COALESCE(busy.running, 0) + ROW_NUMBER() OVER (PARTITION BY jobs.user_id ORDER BY id) AS turn
+    FROM jobs LEFT JOIN busy ON busy.user_id = jobs.user_id
+    WHERE state = 'queued' OR (state = 'running' AND lease_until < :now)
+)
+SELECT COUNT(*) FROM waiting, (SELECT turn, id FROM waiting WHERE id = :job_id) AS target
+WHERE (waiting.turn, waiting.id) <= (target.turn, target.id)
+  AND EXISTS (SELECT 1 FROM jobs WHERE id = :job_id AND state = 'queued')
+"""
+
+# Finished jobs are kept this long (seconds) for /queue history and debugging
+FINISHED_JOB_RETENTION = 24 * 3600
+
+
+class StoredJob:
+    """A row of the shared job table. payload is the JSON-decoded dict the job was queued with."""
+
+    def __init__(self, job_id, user, chat_id, kind, payload, description, state, worker, attempts, error):
+        self.id = job_id
+        self.user = user
+        self.chat_id = chat_id
+        self.kind = kind
+        self.payload = json.loads(payload)
+        self.description = description
+        self.state = state
+        self.worker = worker
+        self.attempts = attempts
+        self.error = error
+
+
+class StateStore(ABC):
+    """Bot state shared by every worker process: per-user sessions, the allow-list and the report job table.
+
+    Backends implement these methods and register in STATE_BACKENDS. User ids
+    are stored as strings, so numeric Telegram ids and usernames both work.
+    Jobs move queued -> running -> done/failed, or queued -> cancelled. A
+    running job holds a lease that its worker renews. When the lease runs out
+    the job is claimed again by any worker, because the one running it is gone.
+    Dune credits are booked per UTC day, user, chain and performance tier.
+    """
+
+    @abstractmethod
+    def get_session(self, user):
+        """The user's session values (chain, format, ...), or {} for a new user."""
+
+    @abstractmethod
+    def update_session(self, user, **values):
+        """Merge values into the user's session."""
+
+    @abstractmethod
+    def seed_allowed_users(self, usernames):
+        """Add usernames to the allow-list the first time the store is used; later calls do nothing."""
+
+    @abstractmethod
+    def is_allowed(self, username):
+        """Whether username is on the allow-list (case-insensitive)."""
+
+    @abstractmethod
+    def allowed_users(self):
+        """The allow-listed usernames, sorted."""
+
+    @abstractmethod
+    def add_allowed_user(self, username, added_by=None):
+        """Add a user to the allow-list; adding one already on it does nothing."""
+
+    @abstractmethod
+    def remove_allowed_user(self, username):
+        """Remove a user from the allow-list; returns False if they were not on it."""
+
+    @abstractmethod
+    def enqueue_job(self, user, chat_id, kind, payload, description, max_queued=None):
+        """Queue a job and return its StoredJob; raises QueueFullError once user has max_queued jobs queued."""
+
+    @abstractmethod
+    def claim_job(self, worker, lease_seconds, max_attempts):
+        """Mark the next job running for worker and return it, or None when nothing is waiting.
+
+        Jobs with an expired lease are only claimed again while they have had fewer than max_attempts claims.
+        """
+
+    @abstractmethod
+    def renew_lease(self, job_id, worker, lease_seconds):
+        """Extend a running job's lease; returns False if worker no longer holds the job."""
+
+    @abstractmethod
+    def release_job(self, job_id, worker):
+        """Put a job worker is giving up (shutdown) back in the queue without using up an attempt."""
+
+    @abstractmethod
+    def finish_job(self, job_id, worker, state, error=None):
+        """Record a running job as 'done' or 'failed'."""
+
+    @abstractmethod
+    def cancel_job(self, job_id):
+        """Cancel a queued job and return it, or None if it is not queued. Running jobs cannot be cancelled."""
+
+    @abstractmethod
+    def reap_jobs(self, max_attempts):
+        """Fail running jobs whose lease expired after max_attempts claims, and return them."""
+
+    @abstractmethod
+    def active_jobs(self):
+        """Queued and running jobs, oldest first."""
+
+    @abstractmethod
+    def position(self, job_id):
+        """1-based place of a queued job in the order workers will claim it, or 0 if it is not queued."""
+
+    @abstractmethod
+    def add_dune_credits(self, user, chain, performance, credits):
+        """Book one Dune execution and the credits it cost against user and chain for today (UTC)."""
+
+    @abstractmethod
+    def dune_credit_usage(self, since_day):
+        """(user, chain, performance, executions, credits) rows booked on or after since_day ('YYYY-MM-DD')."""
+
+    @abstractmethod
+    def record_wallet_activity(self, chain, trades):
+        """Remember the trade count of each wallet in trades ({wallet: count}) from its latest report."""
+
+    @abstractmethod
+    def wallet_activity(self, chain, wallets):
+        """{wallet: trades} for the wallets that have been reported before."""
+
+
+class SqliteStateStore(StateStore):
+    """StateStore in one SQLite file that every worker process on the host opens.
+
+    WAL mode lets readers run alongside the single writer. Each write is one
+    short BEGIN IMMEDIATE transaction, fast enough to run on the event loop,
+    and the busy timeout covers the moments another process holds the lock.
+    """
+
+    def __init__(self, path=None):
+        self.path = path or os.getenv('PNL_STATE_PATH', 'pnl_state.sqlite3')
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(self.path, timeout=30, isolation_level=None, check_same_thread=False)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("PRAGMA synchronous=NORMAL")
+        with self._lock:
+            self._connection.executescript(SCHEMA)
+
+    @contextmanager
+    def _transaction(self):
+        with self._lock:
+            self._connection.execute("BEGIN IMMEDIATE")
+            try:
+                yield self._connection
+            except BaseException:
+                self._connection.execute("ROLLBACK")
+                raise
+            self._connection.execute("COMMIT")
+
+    def _query(self, sql, params=()):
+        with self._lock:
+            return self._connection.execute(sql, params).fetchall()
+
+    def get_session(self, user):
+        rows = self._query("SELECT data FROM sessions WHERE user_id = ?", (str(user),))
+        return json.loads(rows[0][0]) if rows else {}
+
+    def update_session(self, user, **values):
+        with self._transaction() as connection:
+            connection.execute(
+                "INSERT INTO sessions (user_id, data, updated_at) VALUES (?, ?, ?) "
+                "ON CONFLICT (user_id) DO UPDATE SET data = json_patch(data, excluded.data), updated_at = excluded.updated_at",
+                (str(user), json.dumps(values), time.time()),
+            )
+
+    def seed_allowed_users(self, usernames):
+        with self._transaction() as connection:
+            if connection.execute("SELECT 1 FROM state_meta WHERE key = 'allowed_users_seeded'").fetchone():
+                return
+            connection.executemany(
+                "INSERT OR IGNORE INTO allowed_users (username, added_by, added_at) VALUES (?, NULL, ?)",
+                [(username, time.time()) for username in usernames],
+            )
+            connection.execute("INSERT INTO state_meta (key, value) VALUES ('allowed_users_seeded', '1')")
+
+    def is_allowed(self, username):
+        return bool(username) and bool(self._query("SELECT 1 FROM allowed_users WHERE username = ?", (username,)))
+
+    def allowed_users(self):
+        return [row[0] for row in self._query("SELECT username FROM allowed_users ORDER BY username")]
+
+    def add_allowed_user(self, username, added_by=None):
+        with self._transaction() as connection:
+            connection.execute(
+                "INSERT OR IGNORE INTO allowed_users (username, added_by, added_at) VALUES (?, ?, ?)",
+                (username, added_by, time.time()),
+            )
+
+    def remove_allowed_user(self, username):
+        with self._transaction() as connection:
+            return connection.execute("DELETE FROM allowed_users WHERE username = ?", (username,)).rowcount > 0
+
+    def enqueue_job(self, user, chat_id, kind, payload, description, max_queued=None):
+        now = time.time()
+        with self._transaction() as connection:
+            if max_queued:
+                queued = connection.execute(
+                    "SELECT COUNT(*) FROM jobs WHERE user_id = ? AND state = 'queued'", (str(user),)
+                ).fetchone()[0]
+                if queued >= max_queued:
+                    raise QueueFullError(f"You already have {queued} reports queued. Please wait for them to finish.")
+            row = connection.execute(
+                "INSERT INTO jobs (user_id, chat_id, kind, payload, description, state, created_at, updated_at) "
+                f"VALUES (?, ?, ?, ?, ?, 'queued', ?, ?) RETURNING {JOB_COLUMNS}",
+                (str(user), chat_id, kind, json.dumps(payload), description, now, now),
+            ).fetchone()
+        return StoredJob(*row)
+
+    def claim_job(self, worker, lease_seconds, max_attempts):
+        now = time.time()
+        params = {'worker': worker, 'lease_until': now + lease_seconds, 'now': now, 'max_attempts': max_attempts}
+        with self._transaction() as connection:
+            row = connection.execute(CLAIM, params).fetchone()
+        return StoredJob(*row) if row else None
+
+    def renew_lease(self, job_id, worker, lease_seconds):
+        now = time.time()
+        with self._transaction() as connection:
+            return connection.execute(
+                "UPDATE jobs SET lease_until = ?, updated_at = ? WHERE id = ? AND worker = ? AND state = 'running'",
+                (now + lease_seconds, now, job_id, worker),
+            ).rowcount > 0
+
+    def release_job(self, job_id, worker):
+        with self._transaction() as connection:
+            connection.execute(
+                "UPDATE jobs SET state = 'queued', worker = NULL, lease_until = NULL, attempts = attempts - 1, updated_at = ? "
+                "WHERE id = ? AND worker = ? AND state = 'running'",
+                (time.time(), job_id, worker),
+            )
+
+    def finish_job(self, job_id, worker, state, error=None):
+        with self._transaction() as connection:
+            connection.execute(
+                "UPDATE jobs SET state = ?, error = ?, lease_until = NULL, updated_at = ? "
+                "WHERE id = ? AND worker = ? AND state = 'running'",
+                (state, error, time.time(), job_id, worker),
+            )
+
+    def cancel_job(self, job_id):
+        with self._transaction() as connection:
+            row = connection.execute(
+                f"UPDATE jobs SET state = 'cancelled', updated_at = ? WHERE id = ? AND state = 'queued' RETURNING {JOB_COLUMNS}",
+                (time.time(), job_id),
+            ).fetchone()
+        return StoredJob(*row) if row else None
+
+    def reap_jobs(self, max_attempts):
+        now = time.time()
+        with self._transaction() as connection:
+            rows = connection.execute(
+                "UPDATE jobs SET state = 'failed', error = 'worker stopped before finishing', lease_until = NULL, updated_at = ? "
+                f"WHERE state = 'running' AND lease_until < ? AND attempts >= ? RETURNING {JOB_COLUMNS}",
+                (now, now, max_attempts),
+            ).fetchall()
+            connection.execute(
+                "DELETE FROM jobs WHERE state IN ('done', 'failed', 'cancelled') AND updated_at < ?",
+                (now - FINISHED_JOB_RETENTION,),
+            )
+        return [StoredJob(*row) for row in rows]
+
+    def active_jobs(self):
+        rows = self._query(f"SELECT {JOB_COLUMNS} FROM jobs WHERE state IN ('queued', 'running') ORDER BY id")
+        return [StoredJob(*row) for row in rows]
+
+    def position(self, job_id):
+        return self._query(POSITION, {'job_id': job_id, 'now': time.time()})[0][0]
+
+    def add_dune_credits(self, user, chain, performance, credits):
+        day = time.strftime('%Y-%m-%d', time.gmtime())
+        with self._transaction() as connection:
+            connection.execute(
+                "INSERT INTO dune_credits (day, user_id, chain, performance, executions, credits) VALUES (?, ?, ?, ?, 1, ?) "
+                "ON CONFLICT (day, user_id, chain, performance) DO UPDATE SET "
+                "executions = executions + 1, credits = credits + excluded.credits",
+                (day, str(user), chain, performance, credits),
+            )
+
+    def dune_credit_usage(self, since_day):
+        return self._query(
+            "SELECT user_id, chain, performance, SUM(executions), SUM(credits) FROM dune_credits WHERE day >= ? "
+            "GROUP BY user_id, chain, performance ORDER BY SUM(credits) DESC",
+            (since_day,),
+        )
+
+    def record_wallet_activity(self, chain, trades):
+        now = time.time()
+        with self._transaction() as connection:
+            connection.executemany(
+                "INSERT INTO wallet_activity (chain, wallet, trades, updated_at) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT (chain, wallet) DO UPDATE SET trades = excluded.trades, updated_at = excluded.updated_at",
+                [(chain, wallet, int(count), now) for wallet, count in trades.items()],
+            )
+
+    def wallet_activity(self, chain, wallets):
+        wallets = list(wallets)
+        rows = self._query(
+            f"SELECT wallet, trades FROM wallet_activity WHERE chain = ? AND wallet IN ({', '.join('?' * len(wallets))})",
+            (chain, *wallets),
+        )
+        return dict(rows)
+
+
+# PNL_STATE_BACKEND picks one of these; a shared server-backed store registers here
+STATE_BACKENDS = {
+    'sqlite': SqliteStateStore,
+}
+
+_state_store = None
+_state_store_lock = threading.Lock()
+
+
+def get_state_store():
+    """Return the process-wide StateStore for PNL_STATE_BACKEND (default sqlite at PNL_STATE_PATH)."""
+    global _state_store
+    with _state_store_lock:
+        if _state_store is None:
+            backend = os.getenv('PNL_STATE_BACKEND', 'sqlite')
+            if backend not in STATE_BACKENDS:
+                raise ValueError(f"Unknown PNL_STATE_BACKEND {backend!r}; choose from {', '.join(STATE_BACKENDS)}")
+            _state_store = STATE_BACKENDS[backend]()
+        return _state_store
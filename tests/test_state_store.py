@@ -0,0 +1,45 @@
+"""SqliteStateStore.position must predict the order in which claim_job hands out queued jobs."""
+import pytest
+
+from state_store import SqliteStateStore
+
+
+@pytest.fixture
+def store(tmp_path):
+    return SqliteStateStore(str(tmp_path / 'state.sqlite3'))
+
+
+def enqueue(store, users):
+    return [store.enqueue_job(user, None, 'report', {}, f'job for {user}').id for user in users]
+
+
+@pytest.mark.parametrize('users, running', [
+    (['a', 'a', 'a', 'b'], []),
+    (['a', 'b', 'a', 'c', 'b', 'a'], []),
+    (['a', 'a', 'b', 'b', 'c'], ['b', 'b']),
+])
+def test_position_follows_claim_order(store, users, running):
+    for user in running:
+        enqueue(store, [user])
+        store.claim_job('busy-worker', lease_seconds=600, max_attempts=3)
+    ids = enqueue(store, users)
+
+    positions = {job_id: store.position(job_id) for job_id in ids}
+    claimed = [store.claim_job('worker', lease_seconds=600, max_attempts=3).id for _ in ids]
+
+    assert sorted(positions.values()) == list(range(1, len(ids) + 1))
+    assert claimed == sorted(ids, key=positions.get)
+
+
+def test_position_is_zero_once_claimed(store):
+    [job_id] = enqueue(store, ['a'])
+    assert store.position(job_id) == 1
+    store.claim_job('worker', lease_seconds=600, max_attempts=3)
+    assert store.position(job_id) == 0
+
+
+def test_cancel_job_returns_the_cancelled_job(store):
+    job = store.enqueue_job('a', 42, 'report', {'wallet': '0xabc'}, 'job for a')
+    cancelled = store.cancel_job(job.id)
+    assert (cancelled.id, cancelled.chat_id, cancelled.state, cancelled.payload) == (job.id, 42, 'cancelled', {'wallet': '0xabc'})
+    assert store.cancel_job(job.id) is None
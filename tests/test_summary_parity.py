@@ -0,0 +1,94 @@
+"""summarize_transactions must match each chain's summary_tx.sql, column for column.
+
+The summary SELECT of DuneQueries/<chain>/summary_tx.sql is run over SQLite
+against the same transaction rows, so a change to either side that the other
+does not follow (a new metric, reordered columns, a different actual_profit)
+fails here.
+"""
+import math
+import os
+import re
+import sqlite3
+
+import pandas as pd
+import pytest
+
+from chain_specs import CHAIN_SPECS
+from pnl_summary import summarize_transactions
+
+QUERY_DIRS = {'eth': 'Ethereum', 'bnb': 'Binance', 'sol': 'Solana'}
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+WALLET = 'wallet-under-test'
+DAY = '-30'
+
+# Wins, losses, a token traded twice and a fully lost position (-100%)
+TRANSACTIONS = [
+    ('AAA', 1.0, 0.5, 50.0),
+    ('BBB', 2.0, -0.4, -20.0),
+    ('AAA', 0.5, 1.5, 300.0),
+    ('CCC', 0.25, -0.25, -100.0),
+    ('DDD', 3.0, -1.2, -40.0),
+]
+# Tokens received for nothing: transaction.sql books spent_amount 0 as delta_percentage -100,
+# so they count as losses. A win next to a worthless one divides by a zero pnl_l (inf), and
+# with no spend at all avg_profit_per_win is 0 / 0 (NaN)
+ZERO_SPENT = [
+    ('AAA', 1.0, 0.5, 50.0),
+    ('DUST', 0.0, 0.0, -100.0),
+]
+AIRDROPS = [
+    ('AIR', 0.0, 0.8, -100.0),
+    ('DUST', 0.0, 0.0, -100.0),
+]
+
+
+def summary_sql(chain):
+    """The chain's summary SELECT, reading from a transactions table instead of the Dune transaction query."""
+    with open(os.path.join(ROOT, 'DuneQueries', QUERY_DIRS[chain], 'summary_tx.sql')) as file:
+        sql = file.read()
+    if 'wallet_summary AS (' in sql:
+        # Solana inlines the transaction query as main_query and summarizes it in wallet_summary
+        sql = sql.split('wallet_summary AS (', 1)[1].rsplit(')', 1)[0]
+        sql = sql.replace('FROM main_query', 'FROM transactions')
+    else:
+        sql = re.sub(r'FROM\s+"query_[^"]+"', 'FROM transactions', sql)
+    return sql.replace('{{wallet}}', WALLET).replace('{{day}}', DAY)
+
+
+def run_sql_summary(chain, transaction_df):
+    connection = sqlite3.connect(':memory:')
+    try:
+        transaction_df.to_sql('transactions', connection, index=False)
+        cursor = connection.execute(summary_sql(chain))
+        columns = [column[0].lower() for column in cursor.description]
+        return columns, cursor.fetchone()
+    finally:
+        connection.close()
+
+
+def transaction_frame(chain, rows):
+    columns = ['token_symbol', 'spent_amount', CHAIN_SPECS[chain]['delta_column'], 'delta_percentage']
+    return pd.DataFrame(rows, columns=columns).astype({column: float for column in columns[1:]})
+
+
+def assert_same(local, expected):
+    if expected is None:
+        # SQL SUM over no rows is NULL, which pandas holds as NaN. SQLite also returns NULL for
+        # a division by zero, where Dune's DOUBLE division gives inf or NaN like numpy does
+        assert not math.isfinite(local)
+    elif isinstance(expected, str):
+        assert str(local) == expected
+    else:
+        assert local == pytest.approx(expected) or (math.isnan(local) and math.isnan(expected))
+
+
+@pytest.mark.parametrize('chain', sorted(QUERY_DIRS))
+@pytest.mark.parametrize('rows', [TRANSACTIONS, ZERO_SPENT, AIRDROPS, []], ids=['trades', 'zero_spent', 'airdrops', 'empty'])
+def test_summary_matches_sql(chain, rows):
+    transaction_df = transaction_frame(chain, rows)
+    columns, values = run_sql_summary(chain, transaction_df)
+    local = summarize_transactions(transaction_df, WALLET, DAY, CHAIN_SPECS[chain])
+
+    assert list(local.columns) == columns == CHAIN_SPECS[chain]['summary_columns']
+    for column, expected in zip(columns, values):
+        assert_same(local.at[0, column], expected)